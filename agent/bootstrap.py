@@ -0,0 +1,47 @@
+#  ____              _       _
+# | __ )  ___   ___ | |_ ___| |_ _ __ __ _ _ __
+# |  _ \ / _ \ / _ \| __/ __| __| '__/ _` | '_ \
+# | |_) | (_) | (_) | |_\__ \ |_| | | (_| | |_) |
+# |____/ \___/ \___/ \__|___/\__|_|  \__,_| .__/
+#                                         |_|
+#
+
+from utils.profile import Profile
+
+import sys
+import types
+import asyncio
+from engine.manage import Manage
+
+mng = Manage(
+    "adb", "native",
+    hosts=[arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--adb-host=")],
+    parse_mode="stream" if "--parse-mode=stream" in sys.argv else "index"
+)
+
+
+async def settled(timeout: float = 30.0) -> float:
+    try:
+        await asyncio.wait_for(mng.ready.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return Profile.elapsed()
+
+
+def load() -> types.ModuleType:
+    # Static import so standalone builds bundle agent.mcp_server, which the entry script only runs as __main__.
+    from agent import mcp_server
+    return mcp_server
+
+
+async def boot() -> None:
+    # Device discovery runs on the loop while FastMCP and the tools are imported in a worker thread.
+    mng.start()
+    listing = asyncio.create_task(settled()) if Profile.enabled() else None
+
+    server = await asyncio.to_thread(load)
+    await server.main(Profile.elapsed(), listing)
+
+
+if __name__ == '__main__':
+    pass
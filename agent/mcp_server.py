@@ -1,9 +1,36 @@
+from utils.profile import Profile
+
+# Entry point: hand off to the bootstrap before the MCP stack is imported, the tools load as agent.mcp_server.
+if __name__ == "__main__":
+    import asyncio
+    from agent.bootstrap import boot
+    asyncio.run(boot())
+    raise SystemExit(0)
+
+import sys
+import time
+import inspect
 import typing
 import asyncio
+from pathlib import Path
 from loguru import logger
 from mcp.server import FastMCP
-from engine.manage import Manage
+from mcp.server.fastmcp import (
+    Context, Image
+)
+from starlette.requests import Request
+from starlette.responses import (
+    JSONResponse, PlainTextResponse
+)
+from engine.device import Device
+from agent.bootstrap import (
+    mng, settled
+)
+from engine.performance import Memrix
+from engine.sampler import Sampler
+from engine.scheduler import Scheduler
 from utils import const
+from utils.metrics import Metrics
 
 mcp = FastMCP(
     name=const.APP_DESC,
@@ -12,56 +39,173 @@ mcp = FastMCP(
     port=3333,
     json_response=True
 )
-mng = Manage("adb")
+sch = Scheduler()
+perf: dict[str, Memrix] = {}
+samplers: dict[str, Sampler] = {}
+
+Metrics.enabled = "--no-metrics" not in sys.argv
+
+batch_actions = {
+    "click", "send_keys", "tap", "swipe", "key_event", "wait_for", "wait_until_stable", "sleep", "screencap", "gesture"
+}
+batch_inputs = {
+    "send_keys", "tap", "swipe", "key_event", "gesture"
+}
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(_: "Request") -> "JSONResponse":
+    return JSONResponse({"status": "ok", "devices": len(mng.device_list)})
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(_: "Request") -> "PlainTextResponse":
+    queues = {ident: sch.stats(ident) for ident in mng.registry}
+    caches = {ident: record.device.cache_stats for ident, record in mng.registry.items()}
+
+    return PlainTextResponse(Metrics.exposition(const.APP_NAME, {
+        "queue_depth"              : {ident: stats["depth"] for ident, stats in queues.items()},
+        "queue_waited_max_seconds" : {ident: stats["waited_max"] for ident, stats in queues.items()},
+        "snapshot_cache_hits"      : {ident: cache["hits"] for ident, cache in caches.items()},
+        "snapshot_cache_misses"    : {ident: cache["misses"] for ident, cache in caches.items()},
+    }), media_type="text/plain; version=0.0.4")
+
+
+@mcp.tool()
+@Metrics.timed
+async def devices() -> typing.Any:
+    """
+    查看设备注册表。
+
+    行为：
+    - 读取后台持续跟踪的设备注册表，不会阻塞执行 adb devices
+    - 包含已断开、离线、未授权等状态的设备
+
+    返回：
+    - 设备列表：{"serial", "host", "state", "model", "sdk", "size", "tags", "changed", "queue"}
+      host 为设备所在的 adb server（host:port），tags 为设备所属分组，
+      state 为 "device" 时设备可用，changed 为最近一次状态变化时间戳，
+      queue 为该设备命令队列的深度与排队等待耗时
+
+    示例：
+    devices()
+
+    Agent 使用语义：
+    需要了解当前可操作设备及其型号、分辨率、系统版本时使用。
+    """
+
+    mng.start()
+
+    return [
+        record.to_dict() | {"queue": sch.stats(ident)} for ident, record in mng.registry.items()
+    ]
+
+
+@mcp.tool()
+@Metrics.timed
+async def tag_devices(targets: list[str], tags: list[str], remove: bool = False) -> typing.Any:
+    """
+    在设备注册表中定义设备分组（标签）。
+
+    参数：
+    - targets: 设备 serial 或 host/serial 列表
+    - tags: 要添加或移除的标签
+    - remove: 为 True 时移除标签，否则添加
+
+    行为：
+    - 标签记录在注册表中，设备断开重连后仍然保留
+    - 其余工具均支持以下可选设备选择参数，可组合使用：
+        - devices: 只作用于列出的设备（serial 或 host/serial）
+        - tags: 只作用于带有任一指定标签的设备
+        - shard: "i/n"，将选中设备按 host/serial 排序后取第 i 份（共 n 份，i 从 0 开始）
+    - 不同设备子集上的工具调用互不阻塞，可并行执行多个独立计划
+
+    返回：
+    - 被修改的设备列表：{"serial", "host", "state", "model", "sdk", "size", "tags", "changed"}
+
+    示例：
+    tag_devices(targets=["emulator-5554", "emulator-5556"], tags=["login"])
+    click(by="text", value="登录", tags=["login"])
+    run_batch(steps=[...], shard="0/2")
+    run_batch(steps=[...], shard="1/2")
+
+    Agent 使用语义：
+    需要在不同设备子集上运行不同计划时，先为设备打标签再按标签调用工具。
+    """
+
+    mng.start()
+
+    return [record.to_dict() for record in mng.tag(targets, tags, remove)]
 
 
 @mcp.tool()
-async def click(by: typing.Literal["text", "resource-id"], value: str) -> typing.Any:
+@Metrics.timed
+async def click(
+    by: typing.Literal["text", "resource-id", "content-desc"],
+    value: str,
+    match: typing.Literal["exact", "prefix", "regex"] = "exact",
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
     """
-    按指定 UI 属性精确匹配并点击第一个命中的控件。
+    按指定 UI 属性匹配并点击第一个命中的控件。
 
     参数：
     - by:
-        - "text"         → 按控件 text 属性精确匹配
-        - "resource-id"  → 按控件 resource-id 精确匹配
-        - "content_desc" → 按控件 content-desc 精确匹配
+        - "text"         → 按控件 text 属性匹配
+        - "resource-id"  → 按控件 resource-id 匹配
+        - "content-desc" → 按控件 content-desc 匹配
     - value:
-        对应属性的匹配值，必须完整匹配，不支持模糊匹配。
+        对应属性的匹配值。
+    - match:
+        - "exact"  → 完整匹配（默认）
+        - "prefix" → 前缀匹配
+        - "regex"  → 正则搜索匹配
 
     行为：
-    - 获取当前 UI 层级 XML（uiautomator dump）
-    - 在节点树中查找第一个 node.get(by) == value 的控件
+    - 获取当前 UI 层级（同一未变化页面内复用缓存快照）
+    - 通过属性索引查找文档顺序中第一个命中的控件
     - 计算控件 bounds 中心点并执行点击
-    - 在所有已连接设备上并发执行点击操作
+    - 在选中的设备上并发执行点击操作
     - 未找到匹配控件的设备不会执行点击
 
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
     返回：
     - 各设备点击操作结果列表
 
     示例：
     click(by="text", value="登录")
     click(by="resource-id", value="com.xx:id/login_btn")
-    click(by="content_desc", value="login_button")
+    click(by="content-desc", value="login_button")
+    click(by="text", value="确定", match="prefix")
 
     Agent 使用语义：
     当需要对明确 UI 元素执行点击操作时使用。
 
     约束：
-    - 仅支持精确匹配
-    - 不支持 contains / 正则 / 模糊匹配
+    - 默认精确匹配，仅在文案不确定时使用 prefix / regex
     - UI 文案或 ID 变化将导致匹配失败
     """
 
-    device_list = await mng.refresh()
+    device_list = await mng.refresh(devices, tags, shard)
 
-    logger.info(f"Click by {by} value={value}")
-    return await asyncio.gather(
-        *(device.click(by, value) for device in device_list)
+    logger.info(f"Click by {by} value={value} match={match}")
+    return await sch.fan_out(
+        device_list, lambda device: device.click(by, value, match), "click"
     )
 
 
 @mcp.tool()
-async def send_keys(text: str) -> typing.Any:
+@Metrics.timed
+async def send_keys(
+    text: str,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
     """
     向当前已聚焦的输入框逐行输入文本。
 
@@ -74,9 +218,12 @@ async def send_keys(text: str) -> typing.Any:
     - text: 要输入的文本内容，可包含换行符
 
     行为：
-    - 在所有已连接设备上并发执行输入操作
+    - 在选中的设备上并发执行输入操作
     - 若当前无输入焦点，则输入可能失败或无效
 
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
     返回：
     - 各设备输入操作结果列表
 
@@ -88,16 +235,23 @@ async def send_keys(text: str) -> typing.Any:
     当输入框已处于焦点状态时使用。
     """
 
-    device_list = await mng.refresh()
+    device_list = await mng.refresh(devices, tags, shard)
 
     logger.info(f"Send keys {text}")
-    return await asyncio.gather(
-        *(device.send_keys(text) for device in device_list)
+    return await sch.fan_out(
+        device_list, lambda device: device.send_keys(text), "send_keys"
     )
 
 
 @mcp.tool()
-async def tap(x: int, y: int) -> typing.Any:
+@Metrics.timed
+async def tap(
+    x: int,
+    y: int,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
     """
     在指定屏幕绝对坐标执行点击操作。
 
@@ -106,7 +260,10 @@ async def tap(x: int, y: int) -> typing.Any:
     - y: 屏幕纵坐标
 
     行为：
-    - 在所有已连接设备上并发执行点击
+    - 在选中的设备上并发执行点击
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
 
     返回：
     - 各设备点击操作结果列表
@@ -118,16 +275,26 @@ async def tap(x: int, y: int) -> typing.Any:
     当无法通过控件属性定位时使用坐标点击。
     """
 
-    device_list = await mng.refresh()
+    device_list = await mng.refresh(devices, tags, shard)
 
     logger.info(f"Tap {x} {y}")
-    return await asyncio.gather(
-        *(device.tap(x, y) for device in device_list)
+    return await sch.fan_out(
+        device_list, lambda device: device.tap(x, y), "tap"
     )
 
 
 @mcp.tool()
-async def swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> typing.Any:
+@Metrics.timed
+async def swipe(
+    x1: int,
+    y1: int,
+    x2: int,
+    y2: int,
+    duration: int = 300,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
     """
     从起点坐标滑动到终点坐标。
 
@@ -137,7 +304,10 @@ async def swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> typi
     - duration: 滑动耗时（毫秒）
 
     行为：
-    - 在所有已连接设备上并发执行滑动操作
+    - 在选中的设备上并发执行滑动操作
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
 
     返回：
     - 各设备滑动操作结果列表
@@ -150,16 +320,85 @@ async def swipe(x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> typi
     用于页面滚动、列表翻页、拖动操作。
     """
 
-    device_list = await mng.refresh()
+    device_list = await mng.refresh(devices, tags, shard)
 
     logger.info(f"Swipe {x1} {y1} {x2} {y2} {duration}")
-    return await asyncio.gather(
-        *(device.swipe(x1, y1, x2, y2, duration) for device in device_list)
+    return await sch.fan_out(
+        device_list, lambda device: device.swipe(x1, y1, x2, y2, duration), "swipe"
     )
 
 
 @mcp.tool()
-async def key_event(keycode: int) -> typing.Any:
+@Metrics.timed
+async def gesture(
+    kind: typing.Literal["swipe", "curve", "fling", "pinch", "multi"],
+    points: typing.Optional[list[list[float]]] = None,
+    paths: typing.Optional[list[list[list[float]]]] = None,
+    duration: typing.Optional[float] = None,
+    scale: float = 2.0,
+    repeat: int = 1,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    直接向触摸屏注入原始触控事件，执行曲线、快速滑动、双指缩放、多指手势。
+
+    参数：
+    - kind:
+        - "swipe" → 直线滑动，points=[[x1, y1], [x2, y2]]
+        - "curve" → 贝塞尔曲线滑动，points 为起点、控制点、终点（至少 3 个）
+        - "fling" → 快速甩动，points=[[x1, y1], [x2, y2]]，默认 80ms 完成
+        - "pinch" → 双指缩放，points 为两指起点，scale > 1 张开放大，< 1 收拢缩小
+        - "multi" → 多指手势，paths 为每根手指的折线轨迹（最多 5 指）
+    - points: 屏幕坐标点列表
+    - paths: 多指轨迹列表，每项为一根手指的坐标点列表
+    - duration: 手势持续时间（毫秒），默认 swipe / curve / pinch / multi 为 300，fling 为 80
+    - scale: pinch 的缩放倍数（默认 2.0）
+    - repeat: 连续执行次数，用于压力测试（默认 1）
+
+    行为：
+    - 首次使用时读取 getevent -p 触摸屏参数并缓存
+    - 手势预先计算为原始事件序列，经同一 shell 一次下发，不启动 input 进程
+    - 触摸屏不可直接写入时退化为 sendevent；无多点触控屏时 swipe / fling 退化为 input swipe
+    - 在选中的设备上并发执行
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
+    返回：
+    - 各设备手势执行结果列表
+
+    示例：
+    gesture(kind="fling", points=[[540, 1800], [540, 600]])
+    gesture(kind="curve", points=[[200, 1600], [900, 1200], [200, 800]], duration=500)
+    gesture(kind="pinch", points=[[440, 1200], [640, 1200]], scale=2.5)
+    gesture(kind="multi", paths=[[[300, 1500], [300, 900]], [[700, 1500], [700, 900]]])
+
+    Agent 使用语义：
+    当需要非直线滑动、惯性滚动、缩放或多指操作时使用。
+    """
+
+    device_list = await mng.refresh(devices, tags, shard)
+
+    async def perform(device: "Device") -> typing.Any:
+        async with device.batch():
+            for _ in range(repeat):
+                await device.gesture(kind, points, paths, duration, scale)
+        return {"serial": device.serial, "gestures": repeat}
+
+    logger.info(f"Gesture {kind} points={points} paths={paths} duration={duration} repeat={repeat}")
+    return await sch.fan_out(device_list, perform, "gesture")
+
+
+@mcp.tool()
+@Metrics.timed
+async def key_event(
+    keycode: int,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
     """
     向设备发送 Android 系统按键事件。
 
@@ -173,7 +412,10 @@ async def key_event(keycode: int) -> typing.Any:
     - 82 → MENU
 
     行为：
-    - 在所有已连接设备上并发发送按键事件
+    - 在选中的设备上并发发送按键事件
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
 
     返回：
     - 各设备按键事件执行结果列表
@@ -186,15 +428,176 @@ async def key_event(keycode: int) -> typing.Any:
     用于系统级导航与确认操作。
     """
 
-    device_list = await mng.refresh()
+    device_list = await mng.refresh(devices, tags, shard)
 
     logger.info(f"KeyEvent {keycode}")
-    return await asyncio.gather(
-        *(device.key_event(keycode) for device in device_list)
+    return await sch.fan_out(
+        device_list, lambda device: device.key_event(keycode), "key_event"
+    )
+
+
+@mcp.tool()
+@Metrics.timed
+async def wait_for(
+    by: typing.Literal["text", "resource-id", "content-desc"],
+    value: str,
+    timeout: float = 10.0,
+    match: typing.Literal["exact", "prefix", "regex"] = "exact",
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    等待指定控件出现，出现后立即返回。
+
+    参数：
+    - by: 匹配属性，"text" / "resource-id" / "content-desc"
+    - value: 对应属性的匹配值
+    - timeout: 最长等待时间（秒）
+    - match: "exact" / "prefix" / "regex"，默认精确匹配
+
+    行为：
+    - 反复获取 UI 层级，轮询间隔从 0.1 秒起逐步退避至 1 秒
+    - 控件出现即返回，不会多等
+    - 命中时的层级快照会被缓存，后续 click 无需再次获取
+    - 在选中的设备上并发等待
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
+    返回：
+    - 各设备结果列表：{"serial", "found", "waited", "queued"}，waited 为实际等待秒数，
+      queued 为该设备命令队列中排队的秒数
+
+    示例：
+    wait_for(by="text", value="登录", timeout=15)
+
+    Agent 使用语义：
+    在点击前需要确认页面已加载出目标控件时使用，代替固定 sleep。
+    """
+
+    device_list = await mng.refresh(devices, tags, shard)
+
+    logger.info(f"Wait for {by} value={value} timeout={timeout}")
+    return await sch.fan_out(
+        device_list, lambda device: device.wait_for(by, value, timeout, match), "wait_for"
+    )
+
+
+@mcp.tool()
+@Metrics.timed
+async def wait_until_stable(
+    timeout: float = 10.0,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    等待页面稳定（UI 层级不再变化）。
+
+    参数：
+    - timeout: 最长等待时间（秒）
+
+    行为：
+    - 反复获取 UI 层级并比较内容哈希，连续两次一致即视为稳定
+    - 轮询间隔从 0.1 秒起逐步退避至 1 秒
+    - 在选中的设备上并发等待
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
+    返回：
+    - 各设备结果列表：{"serial", "stable", "waited", "queued"}，waited 为实际等待秒数，
+      queued 为该设备命令队列中排队的秒数
+
+    示例：
+    wait_until_stable(timeout=8)
+
+    Agent 使用语义：
+    页面跳转、列表加载或动画之后，需要等待界面静止时使用，代替固定 sleep。
+
+    约束：
+    - 含持续变化内容（计时器、轮播）的页面可能直到超时都不稳定
+    """
+
+    device_list = await mng.refresh(devices, tags, shard)
+
+    logger.info(f"Wait until stable timeout={timeout}")
+    return await sch.fan_out(
+        device_list, lambda device: device.wait_until_stable(timeout), "wait_until_stable"
+    )
+
+
+@mcp.tool()
+@Metrics.timed
+async def screencap(
+    output: typing.Literal["image", "hash"] = "image",
+    fmt: typing.Literal["png", "raw"] = "png",
+    count: int = 1,
+    fps: float = 2.0,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    截取设备屏幕，帧数据直接经 exec-out 流式读入内存，不落盘。
+
+    参数：
+    - output:
+        - "image" → 返回截图图像（默认）
+        - "hash"  → 只返回帧信息与内容哈希，适合每一步都截图做画面比对
+    - fmt:
+        - "png" → 设备端编码 PNG（默认，传输体积小）
+        - "raw" → 原始 RGBA 像素，设备端无需编码，适合配合 hash 高频截图
+    - count: 连拍帧数（默认 1）
+    - fps: 连拍帧率（每秒帧数，默认 2）
+
+    行为：
+    - 在选中的设备上并发截图，每台设备按 fps 连续截取 count 帧
+    - 截图不写入 /sdcard，也不产生本地文件
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
+    返回：
+    - 各设备帧信息：{"serial", "host", "frames", "distinct"}
+      frames 为 {"format", "width", "height", "bytes", "digest", "elapsed"} 列表，
+      distinct 为不同画面数量
+    - output 为 "image" 时，各设备信息后紧跟对应的 PNG 图像
+
+    示例：
+    screencap()
+    screencap(output="hash", fmt="raw")
+    screencap(output="hash", count=10, fps=5)
+
+    Agent 使用语义：
+    需要查看当前画面，或确认画面是否发生变化 / 动画是否结束时使用。
+    """
+
+    device_list = await mng.refresh(devices, tags, shard)
+
+    logger.info(f"Screencap output={output} fmt={fmt} count={count} fps={fps}")
+    results = await sch.fan_out(
+        device_list, lambda device: device.burst(count, fps, fmt), "screencap"
     )
 
+    contents = []
+    for device, frames in zip(device_list, results):
+        contents.append({
+            "serial"   : device.serial,
+            "host"     : device.host,
+            "frames"   : [frame.to_dict() for frame in frames],
+            "distinct" : len({frame.digest for frame in frames}),
+        })
+        if output == "image":
+            for frame in frames:
+                contents.append(Image(data=await asyncio.to_thread(frame.png), format="png"))
+
+    return contents
+
 
 @mcp.tool()
+@Metrics.timed
 async def sleep(delay: float) -> None:
     """
     等待指定秒数。
@@ -218,11 +621,584 @@ async def sleep(delay: float) -> None:
     约束：
     - sleep 只是时间等待，不代表页面就绪
     - 后续操作仍可能失败，需要结合点击结果或页面验证
+    - 等待控件出现请使用 wait_for，等待页面静止请使用 wait_until_stable
     """
 
     logger.info(f"Wait {delay}")
     await asyncio.sleep(delay)
 
 
-if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
+async def batch_step(device: "Device", action: str, args: dict[str, typing.Any]) -> typing.Any:
+    match action:
+        case "screencap":
+            frames = await device.burst(args.get("count", 1), args.get("fps", 2.0), args.get("fmt", "png"))
+            return {"frames": [frame.to_dict() for frame in frames], "distinct": len({f.digest for f in frames})}
+        case "gesture":
+            args = dict(args)
+            for _ in range(repeat := args.pop("repeat", 1)):
+                await device.gesture(**args)
+            return {"gestures": repeat}
+        case _:
+            return await getattr(device, action)(**args)
+
+
+@mcp.tool()
+@Metrics.timed
+async def run_batch(
+    steps: list[dict[str, typing.Any]],
+    loop_count: int = 1,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    在服务端一次性执行整段步骤序列，可循环多次。
+
+    参数：
+    - steps: 步骤列表，每一步为 {"action": 工具名, "args": {参数}}，
+      也兼容规划结果中的 {"action": {"action": 工具名, "args": {参数}}}
+      可用工具名：click / send_keys / tap / swipe / key_event / wait_for / wait_until_stable / sleep / screencap / gesture
+    - loop_count: 整段步骤循环执行次数
+
+    行为：
+    - 各设备独立、按顺序执行全部步骤，设备之间并发
+    - 某设备任一步骤抛出异常时，该设备停止后续步骤，其余设备不受影响
+    - 所有步骤在服务端完成，无需逐步往返调用工具
+    - 连续的 tap / swipe / key_event / send_keys / gesture 作为同一个设备任务执行，
+      合并为一次设备端脚本下发，随后才执行 click / wait_* / screencap / sleep 等步骤，保证先后顺序
+    - 合并仅在该设备任务内部生效，其他工具对同一设备的输入不会被并入，按排队顺序立即执行
+    - 被合并的输入步骤 last 结果为空，脚本下发耗时计入该组最后一步
+    - 每一步的 args 与同名工具的参数一致，执行前统一校验，任一步参数不合法时整批不执行
+    - screencap 步骤只返回帧信息 {"frames", "distinct"}，不返回图像，output 参数被忽略
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
+    返回：
+    - 各设备汇总结果：{"serial", "host", "completed", "elapsed", "error", "steps"}
+      steps 按步骤序号汇总：{"action", "runs", "elapsed_avg", "elapsed_max", "last"}
+
+    示例：
+    run_batch(steps=[
+        {"action": "click", "args": {"by": "text", "value": "开始"}},
+        {"action": "wait_until_stable", "args": {"timeout": 5}},
+        {"action": "key_event", "args": {"keycode": 4}}
+    ], loop_count=50)
+
+    Agent 使用语义：
+    当一组步骤需要整体执行或重复多次时使用，代替逐个调用工具。
+    """
+
+    plan = [
+        (step["action"] if isinstance(step.get("action"), dict) else step) for step in steps
+    ]
+    for step in plan:
+        if step.get("action") not in batch_actions:
+            raise ValueError(f"Unsupported batch action {step.get('action')}")
+        try:
+            inspect.signature(globals()[step["action"]]).bind(**step.get("args", {}))
+        except TypeError as e:
+            raise ValueError(f"Invalid args for batch action {step['action']}: {e}")
+
+    segments: list[list[tuple[int, dict[str, typing.Any]]]] = []
+    for index, step in enumerate(plan):
+        if step["action"] in batch_inputs and segments and segments[-1][-1][1]["action"] in batch_inputs:
+            segments[-1].append((index, step))
+        else:
+            segments.append([(index, step)])
+
+    device_list = await mng.refresh(devices, tags, shard)
+
+    def arguments(step: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        return {k: v for k, v in step.get("args", {}).items() if k not in {"devices", "tags", "shard"}}
+
+    async def execute(device: "Device") -> dict[str, typing.Any]:
+        summary = [
+            {"action": step["action"], "runs": 0, "elapsed_avg": 0.0, "elapsed_max": 0.0, "last": None}
+            for step in plan
+        ]
+        begin, completed, error = time.perf_counter(), 0, None
+
+        async def run(
+            segment: list[tuple[int, dict[str, typing.Any]]]
+        ) -> tuple[list[list], typing.Optional[Exception]]:
+
+            done = []
+            try:
+                async with device.batch():
+                    for index, step in segment:
+                        start = time.perf_counter()
+                        result = await batch_step(device, step["action"], arguments(step))
+                        done.append([index, start, time.perf_counter(), result])
+            except Exception as e:
+                return done, e
+            if done:
+                done[-1][2] = time.perf_counter()
+            return done, None
+
+        try:
+            for _ in range(loop_count):
+                for segment in segments:
+                    if segment[0][1]["action"] == "sleep":
+                        start = time.perf_counter()
+                        await asyncio.sleep(**arguments(segment[0][1]))
+                        done, failure = [[segment[0][0], start, time.perf_counter(), None]], None
+                    else:
+                        label = "+".join(dict.fromkeys(step["action"] for _, step in segment))
+                        done, failure = await sch.submit(device, lambda s=segment: run(s), label)
+
+                    for index, start, end, result in done:
+                        record = summary[index]
+                        record["elapsed_avg"] += (end - start - record["elapsed_avg"]) / (record["runs"] + 1)
+                        record["elapsed_max"] = max(record["elapsed_max"], end - start)
+                        record["runs"] += 1
+                        record["last"] = result
+                        completed += 1
+
+                    if failure:
+                        raise failure
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.error(f"{device.serial} batch stopped after {completed} steps: {error}")
+
+        for record in summary:
+            record["elapsed_avg"] = round(record["elapsed_avg"], 4)
+            record["elapsed_max"] = round(record["elapsed_max"], 4)
+
+        return {
+            "serial"    : device.serial,
+            "host"      : device.host,
+            "completed" : completed,
+            "elapsed"   : round(time.perf_counter() - begin, 4),
+            "error"     : error,
+            "steps"     : summary,
+        }
+
+    logger.info(f"Run batch {len(plan)} steps x {loop_count}")
+    return await asyncio.gather(
+        *(execute(device) for device in device_list)
+    )
+
+
+def perf_select(
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> list[Memrix]:
+
+    if devices is None and tags is None and shard is None:
+        return list(perf.values())
+
+    selected = {device.ident for device in mng.select(devices, tags, shard)}
+    return [controller for ident, controller in perf.items() if ident in selected]
+
+
+async def perf_follow(
+    ctx: "Context",
+    controller: "Memrix",
+    job: typing.Awaitable
+) -> dict[str, typing.Any]:
+
+    begin, task = time.perf_counter(), asyncio.ensure_future(job)
+
+    async for line in controller.follow(task):
+        if line:
+            await ctx.info(f"{controller.serial} {line}")
+
+    try:
+        await task
+    except Exception as e:
+        return {"serial": controller.serial, "scene": controller.scene, "error": f"{type(e).__name__}: {e}"}
+
+    return {
+        "serial"     : controller.serial,
+        "scene"      : controller.scene,
+        "returncode" : controller.transports.returncode if controller.transports else None,
+        "elapsed"    : round(time.perf_counter() - begin, 4),
+        "error"      : None,
+    }
+
+
+async def perf_gather(ctx: "Context", jobs: list[typing.Awaitable]) -> list[typing.Any]:
+    results, total = [], len(jobs)
+
+    for future in asyncio.as_completed(jobs):
+        results.append(await future)
+        await ctx.report_progress(len(results), total)
+
+    return sorted(results, key=lambda r: r["serial"] or "")
+
+
+@mcp.tool()
+@Metrics.timed
+async def perf_begin(
+    ctx: "Context",
+    mode: typing.Literal["storm", "sleek"],
+    focus: str,
+    imply: typing.Optional[str] = None,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    开始采集性能数据（Memrix 场景）。
+
+    参数：
+    - mode:
+        - "storm" → 内存采集
+        - "sleek" → 帧率 / GFX 采集
+    - focus: 目标应用包名
+    - imply: 传递给 Memrix 的附加参数（可选）
+
+    行为：
+    - 每台设备启动独立的 Memrix 采集进程，场景名带设备标识
+    - Memrix 经固定的停止端口（127.0.0.1:8765）接收结束指令，同一时间只能运行一个场景，
+      停止端口已被其他场景占用时，该设备返回错误，需先 perf_end 结束正在采集的场景
+    - 采集进程就绪后立即返回，不阻塞后续工具调用
+    - 同一设备已有场景在采集时，该设备返回错误
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
+    返回：
+    - 各设备场景信息：{"serial", "scene", "mode", "startup", "error"}
+
+    示例：
+    perf_begin(mode="storm", focus="com.example.app")
+
+    Agent 使用语义：
+    需要在自动化操作过程中采集内存或帧率数据时，在操作开始前调用，结束后调用 perf_end。
+    """
+
+    device_list = await mng.refresh(devices, tags, shard)
+
+    async def begin(device: "Device") -> dict[str, typing.Any]:
+        if (controller := perf.get(device.ident)) and controller.running:
+            return {"serial": device.serial, "scene": controller.scene, "error": "Scene already running"}
+
+        controller = Memrix(device.serial, device.host)
+        try:
+            await controller.task_begin(f"--{mode}", focus, imply)
+        except Exception as e:
+            return {"serial": device.serial, "scene": controller.scene, "error": f"{type(e).__name__}: {e}"}
+        perf[device.ident] = controller
+
+        await ctx.info(f"{device.serial} perf scene {controller.scene} started")
+        return {
+            "serial"  : device.serial,
+            "scene"   : controller.scene,
+            "mode"    : mode,
+            "startup" : round(controller.startup, 4),
+            "error"   : None,
+        }
+
+    logger.info(f"Perf begin mode={mode} focus={focus}")
+    return await perf_gather(ctx, [begin(device) for device in device_list])
+
+
+@mcp.tool()
+@Metrics.timed
+async def perf_end(
+    ctx: "Context",
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    结束性能数据采集。
+
+    行为：
+    - 通知正在采集的 Memrix 场景停止并等待其落盘退出
+    - 采集进程的输出以日志消息实时推送
+    - 未在采集的场景会被跳过
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有正在采集的场景，用法见 tag_devices
+
+    返回：
+    - 各设备结束结果：{"serial", "scene", "returncode", "elapsed", "error"}
+
+    示例：
+    perf_end()
+
+    Agent 使用语义：
+    自动化操作完成后调用，随后可调用 perf_report 生成报告。
+    """
+
+    controllers = [controller for controller in perf_select(devices, tags, shard) if controller.running]
+
+    logger.info(f"Perf end {len(controllers)} scenes")
+    return await perf_gather(ctx, [
+        perf_follow(ctx, controller, controller.task_final()) for controller in controllers
+    ])
+
+
+@mcp.tool()
+@Metrics.timed
+async def perf_report(
+    ctx: "Context",
+    layer: bool = False,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    为已结束的性能采集场景生成报告。
+
+    参数：
+    - layer: 内存报告是否按图层展开（仅 storm 场景有效）
+
+    行为：
+    - storm 场景生成内存报告，sleek 场景生成帧率报告
+    - 多个场景的报告并发生成，生成过程的输出以日志消息实时推送
+    - 仍在采集的场景会被跳过
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有场景，用法见 tag_devices
+
+    返回：
+    - 各设备报告结果：{"serial", "scene", "returncode", "elapsed", "error"}
+
+    示例：
+    perf_report()
+    perf_report(layer=True)
+
+    Agent 使用语义：
+    在 perf_end 之后调用，获取性能报告。
+    """
+
+    controllers = [
+        controller for controller in perf_select(devices, tags, shard) if controller.mode and not controller.running
+    ]
+
+    logger.info(f"Perf report {len(controllers)} scenes")
+    return await perf_gather(ctx, [
+        perf_follow(
+            ctx, controller,
+            controller.mem_reporter("--layer" if layer else None) if controller.mode == "--storm" else controller.gfx_reporter()
+        ) for controller in controllers
+    ])
+
+
+@mcp.tool()
+@Metrics.timed
+async def sample_begin(
+    package: str,
+    interval: float = 1.0,
+    capacity: int = 3600,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    开始在设备端采样被测应用的 CPU、内存与帧耗时。
+
+    参数：
+    - package: 被测应用包名
+    - interval: 采样间隔（秒，默认 1）
+    - capacity: 每台设备最多保留的样本数，超出后覆盖最旧样本（默认 3600）
+
+    行为：
+    - 每个采样周期经独立的常驻 shell 读取 /proc/<pid>/stat、dumpsys meminfo、dumpsys gfxinfo framestats
+    - 采样在后台持续进行，不占用设备命令队列，不阻塞其他工具
+    - 同一设备重复调用会替换原有采样
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有已连接设备，用法见 tag_devices
+
+    返回：
+    - 各设备采样配置：{"serial", "package", "interval", "capacity"}
+
+    示例：
+    sample_begin(package="com.example.app", interval=0.5)
+
+    Agent 使用语义：
+    需要观察自动化操作过程中应用的资源占用与卡顿情况时，在操作前调用。
+    """
+
+    device_list = await mng.refresh(devices, tags, shard)
+
+    results = []
+    for device in device_list:
+        if sampler := samplers.pop(device.ident, None):
+            await sampler.stop()
+        samplers[device.ident] = sampler = Sampler(device, package, interval, capacity)
+        sampler.start()
+        results.append({"serial": device.serial, "package": package, "interval": interval, "capacity": capacity})
+
+    logger.info(f"Sample begin {package} interval={interval}")
+    return results
+
+
+@mcp.tool()
+@Metrics.timed
+async def sample_end(
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    停止设备端采样，已采集的样本保留，仍可通过 sample_query 查询与导出。
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有正在采样的设备，用法见 tag_devices
+
+    返回：
+    - 各设备采样状态：{"serial", "package", "samples"}
+
+    示例：
+    sample_end()
+    """
+
+    selected = None if devices is None and tags is None and shard is None else {
+        device.ident for device in mng.select(devices, tags, shard)
+    }
+
+    results = []
+    for ident, sampler in samplers.items():
+        if sampler.running and (selected is None or ident in selected):
+            await sampler.stop()
+            results.append({
+                "serial": sampler.device.serial, "package": sampler.package, "samples": len(sampler.rings["timestamp"])
+            })
+
+    logger.info(f"Sample end {len(results)} samplers")
+    return results
+
+
+@mcp.tool()
+@Metrics.timed
+async def sample_query(
+    since: typing.Optional[float] = None,
+    last: typing.Optional[int] = 60,
+    export: bool = False,
+    devices: typing.Optional[list[str]] = None,
+    tags: typing.Optional[list[str]] = None,
+    shard: typing.Optional[str] = None
+) -> typing.Any:
+    """
+    查询设备端采样结果，并按动作汇总。
+
+    参数：
+    - since: 只返回该时间戳（秒）之后的样本（可选）
+    - last: 只返回最近 N 个样本（默认 60，传 null 返回全部）
+    - export: 为 True 时将所选样本按列导出为 CSV 文件
+
+    行为：
+    - 每个样本关联其采集时刻正在执行或最近执行的工具动作
+    - 按动作汇总 CPU 均值、PSS 峰值、帧数、卡顿帧数、最长帧耗时
+
+    设备选择：
+    - devices / tags / shard 均可选，缺省为所有有样本的设备，用法见 tag_devices
+
+    返回：
+    - 各设备结果：{"serial", "package", "running", "cost", "columns", "actions", "export"}
+      columns 为列式样本：timestamp / cpu(%) / threads / pss(KB) / java_heap(KB) / native(KB) /
+      frames / janky / frame_avg(ms) / frame_max(ms) / action
+      cost 为最近一次采样耗时（秒），export 为导出文件路径
+
+    示例：
+    sample_query(last=10)
+    sample_query(last=None, export=True)
+
+    Agent 使用语义：
+    需要判断某个操作是否引起卡顿、内存上涨或 CPU 飙高时使用。
+    """
+
+    selected = None if devices is None and tags is None and shard is None else {
+        device.ident for device in mng.select(devices, tags, shard)
+    }
+
+    results = []
+    for ident, sampler in samplers.items():
+        if selected is not None and ident not in selected:
+            continue
+        columns = sampler.rows(since, last)
+        results.append({
+            "serial"  : sampler.device.serial,
+            "package" : sampler.package,
+            "running" : sampler.running,
+            "cost"    : round(sampler.cost, 4),
+            "columns" : columns,
+            "actions" : sampler.summary(columns),
+            "export"  : await asyncio.to_thread(
+                sampler.export, Path.home() / f".{const.APP_NAME}" / "samples", columns
+            ) if export else None,
+        })
+
+    return results
+
+
+@mcp.tool()
+@Metrics.timed
+async def stats(reset: bool = False) -> typing.Any:
+    """
+    查看服务自身的耗时统计。
+
+    参数：
+    - reset: 读取后是否清空已累计的耗时直方图，默认 False
+
+    行为：
+    - 汇总每个工具调用、adb 命令、UI dump、XML 解析、节点查找等环节的耗时
+    - 耗时按设备拆分，以对数分桶的直方图累计，内存占用固定
+    - 同一份数据也以 Prometheus 文本格式暴露在 HTTP /metrics 路径
+    - 服务以 --no-metrics 启动时不采集，spans 为空
+
+    返回：
+    - {"enabled", "spans", "devices"}
+      spans 按 "环节 -> 设备 -> {count, mean, p50, p95, p99, max}" 组织，单位为秒；
+      环节名：tool.<工具名>、job.<工具名>、cmd_line、shell、dump、parse、seek、lookup、io_wait，
+      io_wait 为等待 adb 并发名额的耗时，
+      设备为 "*" 表示该环节不区分设备；
+      devices 为每台设备的命令队列、快照缓存命中与 UI dump 方式
+
+    示例：
+    stats()
+    stats(reset=True)
+
+    Agent 使用语义：
+    操作明显变慢、需要定位瓶颈在设备、adb 还是解析环节时使用。
+    """
+
+    result = {
+        "enabled" : Metrics.enabled,
+        "spans"   : Metrics.snapshot(),
+        "devices" : [
+            {
+                "serial"    : record.serial,
+                "host"      : record.device.host,
+                "queue"     : sch.stats(ident),
+                "cache"     : record.device.cache_stats,
+                "dump_mode" : record.device.dump_mode,
+            } for ident, record in mng.registry.items()
+        ],
+    }
+
+    if reset:
+        Metrics.reset()
+
+    return result
+
+
+async def startup_profile(imported: float, listing: asyncio.Task) -> None:
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(mcp.settings.host, mcp.settings.port)
+        except OSError:
+            await asyncio.sleep(0.02); continue
+        writer.close(); break
+    serving = Profile.elapsed()
+    listed  = await listing
+
+    logger.info(await asyncio.to_thread(Profile.report, "mcp_server", "agent.mcp_server", {
+        "module imported": imported, "http ready": serving, "devices listed": listed
+    }))
+
+
+async def main(imported: typing.Optional[float] = None, listing: typing.Optional[asyncio.Task] = None) -> None:
+    mng.start()
+
+    if Profile.enabled():
+        asyncio.create_task(startup_profile(imported or Profile.elapsed(), listing or asyncio.create_task(settled())))
+
+    await mcp.run_streamable_http_async()
@@ -0,0 +1,191 @@
+#  ____       _     _
+# | __ ) _ __(_) __| | __ _  ___
+# |  _ \| '__| |/ _` |/ _` |/ _ \
+# | |_) | |  | | (_| | (_| |  __/
+# |____/|_|  |_|\__,_|\__, |\___|
+#                     |___/
+#
+
+import struct
+import typing
+import asyncio
+import contextlib
+from collections import deque
+from utils import const
+
+Link = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class Bridge(object):
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5037, pool_size: int = 4) -> None:
+        self.host      = host
+        self.port      = port
+        self.pool_size = pool_size
+
+        self.idle: dict[str, deque[Link]] = {}
+        self.gate: dict[str, asyncio.Semaphore] = {}
+        self.task: set[asyncio.Task] = set()
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @staticmethod
+    async def read(reader: asyncio.StreamReader, size: int) -> bytes:
+        try:
+            return await reader.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionError(f"adb server closed connection after {len(e.partial)}/{size} bytes") from e
+
+    @staticmethod
+    async def status(reader: asyncio.StreamReader) -> None:
+        if (head := await Bridge.read(reader, 4)) == b"OKAY":
+            return None
+
+        size = int(await Bridge.read(reader, 4), 16)
+        message = (await Bridge.read(reader, size)).decode(const.CHARSET, const.IGNORE)
+        raise ConnectionError(f"{head.decode(const.CHARSET, const.IGNORE)} {message}")
+
+    @staticmethod
+    async def request(link: Link, payload: str) -> None:
+        reader, writer = link
+
+        data = payload.encode(const.CHARSET)
+        writer.write(b"%04x" % len(data) + data)
+        await writer.drain()
+
+        await Bridge.status(reader)
+
+    @staticmethod
+    def discard(link: Link) -> None:
+        link[1].close()
+
+    async def connect(self) -> Link:
+        return await asyncio.open_connection(self.host, self.port, limit=const.STREAM_LIMIT)
+
+    async def transport(self, serial: str) -> Link:
+        link = await self.connect()
+        try:
+            await self.request(link, f"host:transport:{serial}")
+        except BaseException:
+            self.discard(link); raise
+        return link
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, serial: str) -> typing.AsyncIterator[Link]:
+        gate = self.gate.setdefault(serial, asyncio.Semaphore(self.pool_size))
+        idle = self.idle.setdefault(serial, deque())
+
+        async with gate:
+            link = None
+            while idle and not link:
+                if (link := idle.popleft())[0].at_eof():
+                    self.discard(link); link = None
+
+            link = link or await self.transport(serial)
+            try:
+                yield link
+            finally:
+                self.discard(link)
+
+        self.task.add(task := asyncio.create_task(self.refill(serial)))
+        task.add_done_callback(self.task.discard)
+
+    async def refill(self, serial: str) -> None:
+        if len(idle := self.idle[serial]) >= self.pool_size:
+            return None
+
+        try:
+            link = await self.transport(serial)
+        except (OSError, ConnectionError):
+            return None
+
+        if len(idle) < self.pool_size:
+            idle.append(link)
+        else:
+            self.discard(link)
+
+    async def host_query(self, payload: str) -> str:
+        link = await self.connect()
+        try:
+            await self.request(link, payload)
+            size = int(await Bridge.read(link[0], 4), 16)
+            return (await Bridge.read(link[0], size)).decode(const.CHARSET, const.IGNORE)
+        finally:
+            self.discard(link)
+
+    async def devices(self) -> list[tuple[str, str, dict[str, str]]]:
+        device_list = []
+        for line in (await self.host_query("host:devices-l")).splitlines():
+            if len(parts := line.split()) < 2:
+                continue
+            serial, status, *extra = parts
+            device_list.append(
+                (serial, status, dict(e.split(":", 1) for e in extra if ":" in e))
+            )
+
+        return device_list
+
+    async def track(self) -> typing.AsyncIterator[list[tuple[str, str, dict[str, str]]]]:
+        link = await self.connect()
+        try:
+            await self.request(link, "host:track-devices")
+            while True:
+                size = int(await Bridge.read(link[0], 4), 16)
+                payload = (await Bridge.read(link[0], size)).decode(const.CHARSET, const.IGNORE)
+                yield [
+                    (parts[0], parts[1], {}) for line in payload.splitlines() if len(parts := line.split()) >= 2
+                ]
+        finally:
+            self.discard(link)
+
+    async def stream(self, serial: str, service: str) -> typing.AsyncIterator[bytes]:
+        async with self.acquire(serial) as link:
+            await self.request(link, service)
+            while chunk := await link[0].read(65536):
+                yield chunk
+
+    async def exec_out(self, serial: str, command: str) -> bytes:
+        return b"".join([chunk async for chunk in self.stream(serial, f"exec:{command}")])
+
+    async def shell(self, serial: str, command: str) -> str:
+        output = b"".join([chunk async for chunk in self.stream(serial, f"shell:{command}")])
+        return output.decode(const.CHARSET, const.IGNORE).strip()
+
+    async def pull(self, serial: str, remote: str) -> bytes:
+        async with self.acquire(serial) as link:
+            reader, writer = link
+            await self.request(link, "sync:")
+
+            path = remote.encode(const.CHARSET)
+            writer.write(b"RECV" + struct.pack("<I", len(path)) + path)
+            await writer.drain()
+
+            buffer = bytearray()
+            while True:
+                head, size = struct.unpack("<4sI", await Bridge.read(reader, 8))
+                if head == b"DATA":
+                    buffer += await Bridge.read(reader, size)
+                elif head == b"DONE":
+                    break
+                else:
+                    message = (await Bridge.read(reader, size)).decode(const.CHARSET, const.IGNORE)
+                    raise ConnectionError(f"{head.decode(const.CHARSET, const.IGNORE)} {message}")
+
+            writer.write(b"QUIT" + struct.pack("<I", 0))
+            await writer.drain()
+
+            return bytes(buffer)
+
+    async def close(self) -> None:
+        for task in list(self.task):
+            task.cancel()
+
+        for idle in self.idle.values():
+            while idle:
+                self.discard(idle.popleft())
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,115 @@
+#   ____ _                            _
+#  / ___| |__   __ _ _ __  _ __   ___| |
+# | |   | '_ \ / _` | '_ \| '_ \ / _ \ |
+# | |___| | | | (_| | | | | | | |  __/ |
+#  \____|_| |_|\__,_|_| |_|_| |_|\___|_|
+#
+
+import typing
+import importlib
+import threading
+import contextlib
+from loguru import logger
+
+if typing.TYPE_CHECKING:
+    from mcp import (
+        ClientSession, types
+    )
+
+
+class Channel(object):
+
+    def __init__(self, url: str = "http://127.0.0.1:3333/mcp") -> None:
+        self.url = url
+
+        self.stack: typing.Optional[contextlib.AsyncExitStack] = None
+        self.session: typing.Optional["ClientSession"] = None
+
+        self.tools: typing.Optional[list["types.Tool"]] = None
+        self.openai_tools: typing.Optional[list[dict[str, typing.Any]]] = None
+
+    @staticmethod
+    def warm() -> None:
+        threading.Thread(
+            target=importlib.import_module, args=("mcp.client.streamable_http",), daemon=True
+        ).start()
+
+    async def message_handler(self, message: typing.Any) -> None:
+        from mcp import types
+
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            logger.debug(f"⚙️ Tool list changed, schema cache invalidated ...")
+            self.tools = self.openai_tools = None
+
+    async def connect(self) -> "ClientSession":
+        if self.session:
+            return self.session
+
+        from mcp import ClientSession
+        from mcp.client.streamable_http import streamable_http_client
+
+        self.stack = contextlib.AsyncExitStack()
+        try:
+            r, w, _ = await self.stack.enter_async_context(streamable_http_client(self.url))
+            session = await self.stack.enter_async_context(
+                ClientSession(r, w, message_handler=self.message_handler)
+            )
+            await session.initialize()
+        except BaseException:
+            await self.close(); raise
+
+        self.session, self.tools, self.openai_tools = session, None, None
+        logger.debug(f"🔗 MCP session connected {self.url}")
+
+        return self.session
+
+    async def close(self) -> None:
+        stack, self.stack, self.session = self.stack, None, None
+        if stack:
+            with contextlib.suppress(Exception):
+                await stack.aclose()
+
+    async def list_tools(self) -> list["types.Tool"]:
+        for retry in range(2):
+            if self.tools is not None:
+                return self.tools
+
+            session = await self.connect()
+            try:
+                self.tools = (await session.list_tools()).tools
+            except Exception:
+                await self.close()
+                if retry: raise
+
+        return self.tools
+
+    async def list_openai_tools(self) -> list[dict[str, typing.Any]]:
+        if self.openai_tools is None or self.tools is None:
+            self.openai_tools = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description" : tool.description,
+                        "parameters"  : tool.inputSchema
+                    }
+                }
+                for tool in await self.list_tools()
+            ]
+
+            for tool in self.openai_tools: logger.debug(f"⚙️ Tool {tool['function']['name']}")
+
+        return self.openai_tools
+
+    async def call_tool(self, name: str, arguments: dict[str, typing.Any]) -> "types.CallToolResult":
+        session = await self.connect()
+        try:
+            return await session.call_tool(name, arguments)
+        except Exception:
+            await self.close(); raise
+
+
+if __name__ == '__main__':
+    pass
@@ -7,34 +7,170 @@
 
 import re
 import time
+import shlex
 import typing
 import asyncio
-import xml.etree.ElementTree as Et
+import contextlib
 from pathlib import Path
+from collections import deque
+from xml.etree.ElementTree import ParseError
+from loguru import logger
+from engine.shell import Shell
+from engine.bridge import Bridge
+from engine.frame import (
+    Format, Frame
+)
+from engine.gesture import (
+    Gesture, Kind, Point
+)
+from engine.hierarchy import (
+    Node, Seeker, Snapshot
+)
 from engine.terminal import Terminal
 from utils import const
+from utils.metrics import Metrics
 
 
 class Device(object):
 
-    def __init__(self, adb: str, serial: str) -> None:
-        self.prefix = [adb, "-s", serial]
+    unsupported = re.compile(rb"/dev/tty.*(?:fail|denied|no such|not found|enxio)", re.I)
 
-    async def dump_ui_xml(self) -> str | None:
-        xml_file = "/data/local/tmp/window_dump.xml"
+    def __init__(
+        self,
+        adb: str,
+        serial: str,
+        mode: typing.Literal["shell", "spawn", "native"] = "shell",
+        bridge: typing.Optional["Bridge"] = None,
+        snapshot_ttl: float = 3.0,
+        parse_mode: typing.Literal["index", "stream"] = "index"
+    ) -> None:
+
+        self.serial = serial
+        self.host   = bridge.endpoint if bridge else None
+        self.ident  = f"{self.host}/{serial}" if self.host else serial
+        self.prefix = [adb] + (["-H", bridge.host, "-P", str(bridge.port)] if bridge else []) + ["-s", serial]
+
+        self.mode    = mode if mode != "native" or bridge else "shell"
+        self.bridge  = bridge
+        self.session = Shell(self.prefix)
+
+        self.dump_mode: typing.Literal["stream", "file"] = "stream"
+        self.dump_failures = 0
+        self.dump_failure_limit = 5
+        self.dump_latency: deque[float] = deque(maxlen=100)
+
+        self.snapshot: typing.Optional["Snapshot"] = None
+        self.snapshot_ttl = snapshot_ttl
+        self.generation   = 0
+        self.cache_hits   = 0
+        self.cache_misses = 0
+
+        self.parse_mode = parse_mode
+
+        self.frame: typing.Optional["Frame"] = None
+
+        self.pending: typing.Optional[list[list[str]]] = None
+        self.owner: typing.Optional[asyncio.Task] = None
+        self.script_limit = 32 * 1024
+
+        self.touch = Gesture(self)
+
+        self.actions: deque[tuple[float, float, str]] = deque(maxlen=4096)
+
+        self.gates: tuple[asyncio.Semaphore, ...] = ()
+
+    @contextlib.asynccontextmanager
+    async def io(self) -> typing.AsyncIterator[None]:
+        begin = time.perf_counter()
+        async with contextlib.AsyncExitStack() as stack:
+            for gate in self.gates:
+                await stack.enter_async_context(gate)
+            Metrics.observe("io_wait", self.ident, time.perf_counter() - begin)
+            yield
+
+    async def shell(self, *args: str, timeout: typing.Optional[float] = None) -> typing.Any:
+        with Metrics.span("shell", self.ident):
+            if self.pending and self.batching:
+                await self.flush()
+
+            async with self.io():
+                try:
+                    if self.mode == "native":
+                        return await asyncio.wait_for(
+                            self.bridge.shell(self.serial, " ".join(args)), timeout or Terminal.timeout
+                        ) or None
+                    if self.mode == "shell":
+                        _, output = await self.session.execute(" ".join(args), timeout or Terminal.timeout)
+                        return output or None
+                except asyncio.TimeoutError:
+                    return logger.warning(f"{self.serial} shell timeout {' '.join(args)}")
+                except (OSError, ConnectionError) as e:
+                    logger.warning(f"{self.serial} {self.mode} unavailable, fallback to spawn: {e}")
+
+                if (result := await Terminal.cmd_line(self.prefix + ["shell", *args], timeout, self.ident)).timeout:
+                    return logger.warning(f"{self.serial} shell timeout {' '.join(args)}")
+                return result.output
+
+    async def close(self) -> None:
+        await self.session.close()
+
+    async def exec_out(self, *args: str, binary: bool = False) -> typing.AsyncIterator[bytes]:
+        if self.pending and self.batching:
+            await self.flush()
+
+        async with self.io():
+            if self.mode == "native":
+                async for chunk in self.bridge.stream(self.serial, f"exec:{' '.join(args)}"):
+                    yield chunk
+                return
+
+            if self.mode == "shell" and not binary:
+                _, output = await self.session.execute(" ".join(args))
+                yield output.encode(const.CHARSET)
+                return
+
+            transports = await Terminal.cmd_link(self.prefix + ["exec-out", *args])
+            try:
+                while chunk := await transports.stdout.read(65536):
+                    yield chunk
+            finally:
+                Terminal.kill(transports)
+                await transports.wait()
+
+    async def stream_ui_xml(self) -> typing.AsyncIterator[bytes]:
+        closing, tail = b"</hierarchy>", b""
 
-        cmd = self.prefix + [
-            "shell", "uiautomator", "dump", "--compressed", xml_file
-        ]
-        await Terminal.cmd_line(cmd)
+        stream = self.exec_out("uiautomator", "dump", "--compressed", "/dev/tty")
+        try:
+            async for chunk in stream:
+                if (index := (tail + chunk).find(closing)) >= 0:
+                    yield chunk[:index + len(closing) - len(tail)]
+                    return
+                tail = (tail + chunk)[-len(closing):]
+                yield chunk
+        finally:
+            await stream.aclose()
 
-        await asyncio.sleep(1)
+    async def dump_stream(self) -> str | None:
+        xml = b"".join([chunk async for chunk in self.stream_ui_xml()])
+
+        if (start := xml.find(b"<?xml")) < 0 and (start := xml.find(b"<hierarchy")) < 0:
+            if self.unsupported.search(xml):
+                logger.warning(f"{self.serial} streamed dump unsupported, fallback to file")
+                self.dump_mode = "file"
+            return None
+        if not xml.endswith(b"</hierarchy>"):
+            return None
+
+        return xml[start:].decode(const.CHARSET, const.IGNORE)
+
+    async def dump_file(self) -> str | None:
+        xml_file = "/data/local/tmp/window_dump.xml"
+
+        await self.shell("uiautomator", "dump", "--compressed", xml_file)
 
-        cmd = self.prefix + [
-            "shell", "cat", xml_file
-        ]
         for _ in range(5):
-            xml = await Terminal.cmd_line(cmd)
+            xml = await self.shell("cat", xml_file)
 
             if isinstance(xml, bytes):
                 xml = xml.decode(const.CHARSET, const.IGNORE)
@@ -44,64 +180,300 @@ class Device(object):
 
         return None
 
-    async def click(self, by: typing.Literal["text", "resource-id"], value: str) -> typing.Any:
+    async def dump_ui_xml(self) -> str | None:
+        begin = time.perf_counter()
+
+        xml = None
+        if self.dump_mode == "stream":
+            try:
+                xml = await self.dump_stream()
+            except (OSError, ConnectionError) as e:
+                logger.warning(f"{self.serial} streamed dump failed: {e}")
+
+            if xml:
+                self.dump_failures = 0
+            elif self.dump_mode == "stream":
+                self.dump_failures += 1
+                if self.dump_failures >= self.dump_failure_limit:
+                    logger.warning(f"{self.serial} streamed dump failed {self.dump_failures} times, fallback to file")
+                    self.dump_mode = "file"
+                else:
+                    logger.warning(f"{self.serial} streamed dump incomplete, fallback to file once")
+
+        xml = xml or await self.dump_file()
+
+        self.dump_latency.append(cost := time.perf_counter() - begin)
+        Metrics.observe("dump", self.ident, cost)
+        logger.debug(f"{self.serial} dump {self.dump_mode} {cost * 1000:.1f} ms")
+
+        return xml
+
+    def invalidate(self) -> None:
+        self.generation += 1
+        self.snapshot = None
+
+    @property
+    def cache_stats(self) -> dict[str, int]:
+        return {"hits": self.cache_hits, "misses": self.cache_misses}
+
+    async def hierarchy(self, fresh: bool = False) -> typing.Optional["Snapshot"]:
+        if not fresh and self.snapshot and not self.snapshot.expired(self.snapshot_ttl):
+            self.cache_hits += 1
+            return self.snapshot
+
+        self.cache_misses += 1
+        generation = self.generation
+
         if not (xml := await self.dump_ui_xml()):
             return None
 
-        node = None
-        for n in Et.fromstring(xml).iter("node"):
-            if n.attrib.get(by) == value:
-                node = n.attrib; break
+        with Metrics.span("parse", self.ident):
+            snapshot = Snapshot(xml)
+        if generation == self.generation:
+            self.snapshot = snapshot
+        return snapshot
+
+    async def locate(
+        self,
+        by: typing.Literal["text", "resource-id", "content-desc"],
+        value: str,
+        match: typing.Literal["exact", "prefix", "regex"] = "exact"
+    ) -> typing.Optional["Node"]:
+
+        if self.parse_mode == "stream" and self.dump_mode == "stream" and not (
+            self.snapshot and not self.snapshot.expired(self.snapshot_ttl)
+        ):
+            self.cache_misses += 1
+            begin, seeker = time.perf_counter(), Seeker(by, value, match)
 
-        if not node or not (bounds := node.get("bounds")):
+            stream = self.stream_ui_xml()
+            try:
+                async for chunk in stream:
+                    if node := seeker.feed(chunk):
+                        return node
+            except (OSError, ConnectionError, ParseError) as e:
+                logger.warning(f"{self.serial} streamed lookup failed, fallback to snapshot: {e}")
+            else:
+                if seeker.count:
+                    return None
+                logger.warning(f"{self.serial} streamed lookup found no hierarchy, fallback to snapshot")
+            finally:
+                await stream.aclose()
+                self.dump_latency.append(cost := time.perf_counter() - begin)
+                Metrics.observe("seek", self.ident, cost)
+
+        if not (snapshot := await self.hierarchy()):
             return None
 
-        match = re.match(r"\[(\d+),(\d+)]\[(\d+),(\d+)]", bounds)
-        x1, y1, x2, y2 = map(int, match.groups())
+        with Metrics.span("lookup", self.ident):
+            return snapshot.find(by, value, match)
 
-        center = (x1 + x2) // 2, (y1 + y2) // 2
+    async def click(
+        self,
+        by: typing.Literal["text", "resource-id", "content-desc"],
+        value: str,
+        match: typing.Literal["exact", "prefix", "regex"] = "exact"
+    ) -> typing.Any:
+
+        if not (node := await self.locate(by, value, match)) or not (center := node.center):
+            return None
 
         return await self.tap(center[0], center[1])
 
+    async def wait_for(
+        self,
+        by: typing.Literal["text", "resource-id", "content-desc"],
+        value: str,
+        timeout: float = 10.0,
+        match: typing.Literal["exact", "prefix", "regex"] = "exact"
+    ) -> dict[str, typing.Any]:
+
+        begin, interval = time.perf_counter(), 0.1
+
+        while True:
+            if (snapshot := await self.hierarchy(fresh=True)) and snapshot.find(by, value, match):
+                found = True; break
+            if (remaining := timeout - (time.perf_counter() - begin)) <= 0:
+                found = False; break
+
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, 1.0)
+
+        waited = round(time.perf_counter() - begin, 3)
+        logger.debug(f"{self.serial} wait for {by}={value} found={found} waited={waited}s")
+
+        return {"serial": self.serial, "found": found, "waited": waited}
+
+    async def wait_until_stable(self, timeout: float = 10.0, settle: int = 2) -> dict[str, typing.Any]:
+        begin, interval = time.perf_counter(), 0.1
+        digest, repeat = None, 0
+
+        while True:
+            if snapshot := await self.hierarchy(fresh=True):
+                repeat = repeat + 1 if snapshot.digest == digest else 0
+                digest = snapshot.digest
+            if stable := repeat >= settle - 1 and digest is not None:
+                break
+            if (remaining := timeout - (time.perf_counter() - begin)) <= 0:
+                break
+
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, 1.0)
+
+        waited = round(time.perf_counter() - begin, 3)
+        logger.debug(f"{self.serial} wait until stable stable={stable} waited={waited}s")
+
+        return {"serial": self.serial, "stable": stable, "waited": waited}
+
+    @staticmethod
+    def keys(text: str) -> list[list[str]]:
+        commands = []
+        for i, line in enumerate(text.split("\n")):
+            if i:
+                commands.append(["input", "keyevent", "66"])
+            if line:
+                commands.append(["input", "text", shlex.quote(line.replace(" ", "%s"))])
+        return commands
+
+    @staticmethod
+    def coalesce(commands: list[list[str]]) -> list[list[str]]:
+        merged = []
+        for command in commands:
+            if merged and merged[-1][:2] == command[:2] == ["input", "keyevent"]:
+                merged[-1] = merged[-1] + command[2:]
+            else:
+                merged.append(command)
+        return merged
+
+    @property
+    def batching(self) -> bool:
+        return self.pending is not None and self.owner is asyncio.current_task()
+
+    @contextlib.asynccontextmanager
+    async def batch(self) -> typing.AsyncIterator["Device"]:
+        if self.pending is not None:
+            yield self
+            return
+
+        self.pending, self.owner = [], asyncio.current_task()
+        try:
+            yield self
+        finally:
+            try:
+                await self.flush()
+            finally:
+                self.pending, self.owner = None, None
+
+    def scripts(self, commands: list[list[str]]) -> list[str]:
+        chunks, size = [[]], 0
+        for line in (" ".join(command) for command in self.coalesce(commands)):
+            if chunks[-1] and size + len(line) > self.script_limit:
+                chunks.append([]); size = 0
+            chunks[-1].append(line)
+            size += len(line) + 2
+        return ["; ".join(chunk) for chunk in chunks if chunk]
+
+    async def run_script(self, commands: list[list[str]]) -> typing.Any:
+        output = None
+        for script in self.scripts(commands):
+            output = await self.shell(script)
+        return output
+
+    async def flush(self) -> typing.Any:
+        if not self.pending:
+            return None
+
+        commands, self.pending = self.pending, []
+        logger.debug(f"{self.serial} flush {len(commands)} input commands")
+
+        return await self.run_script(commands)
+
+    async def inject(self, *commands: list[str]) -> typing.Any:
+        if not commands:
+            return None
+
+        self.invalidate()
+
+        if not self.batching:
+            return await self.run_script(list(commands))
+
+        self.pending = self.coalesce(self.pending + list(commands))
+        if sum(len(part) + 1 for command in self.pending for part in command) >= self.script_limit:
+            return await self.flush()
+        return None
+
     async def send_keys(self, text: str) -> typing.Any:
-        cmd = self.prefix + [
-            "shell", "input", "text", text
-        ]
-        return await Terminal.cmd_line(cmd)
+        return await self.inject(*self.keys(text))
 
     async def tap(self, x: int, y: int) -> typing.Any:
-        cmd = self.prefix + [
-            "shell", "input", "tap", str(x), str(y)
-        ]
-        return await Terminal.cmd_line(cmd)
+        return await self.inject(["input", "tap", str(x), str(y)])
 
     async def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 300) -> typing.Any:
-        cmd = self.prefix + [
-            "shell", "input", "swipe", str(x1), str(y1), str(x2), str(y2), str(duration)
-        ]
-        return await Terminal.cmd_line(cmd)
+        return await self.inject(["input", "swipe", str(x1), str(y1), str(x2), str(y2), str(duration)])
 
     async def key_event(self, keycode: int) -> typing.Any:
-        cmd = self.prefix + [
-            "shell", "input", "keyevent", str(keycode)
-        ]
-        return await Terminal.cmd_line(cmd)
+        return await self.inject(["input", "keyevent", str(keycode)])
 
-    async def screenshot(self, out_dir: str = ".") -> str:
-        (out := Path(out_dir)).mkdir(parents=True, exist_ok=True)
+    async def gesture(
+        self,
+        kind: "Kind",
+        points: typing.Optional[list["Point"]] = None,
+        paths: typing.Optional[list[list["Point"]]] = None,
+        duration: typing.Optional[float] = None,
+        scale: float = 2.0
+    ) -> typing.Any:
+
+        duration = duration if duration is not None else (80 if kind == "fling" else 300)
+
+        if commands := await self.touch.build(kind, points, paths, duration, scale):
+            return await self.inject(*([command] for command in commands))
+
+        if kind in ("swipe", "fling") and points and len(points) >= 2:
+            (x1, y1), (x2, y2) = points[:2]
+            return await self.swipe(int(x1), int(y1), int(x2), int(y2), int(duration))
 
-        filename = f"screenshot_{time.strftime('%Y%m%d_%H%M%S')}.png"
-        remote   = f"/sdcard/{filename}"
-        local    = out / filename
+        raise RuntimeError(f"{self.serial} gesture {kind} requires a multi-touch screen ...")
 
-        cmd = self.prefix + ["shell", "screencap", "-p", remote]
-        await Terminal.cmd_line(cmd)
+    async def screencap(self, fmt: "Format" = "png") -> typing.Optional["Frame"]:
+        begin = time.perf_counter()
 
-        cmd = self.prefix + ["pull", remote, str(local)]
-        await Terminal.cmd_line(cmd)
+        stream = self.exec_out("screencap", *(["-p"] if fmt == "png" else []), binary=True)
+        try:
+            data = b"".join([chunk async for chunk in stream])
+        except (OSError, ConnectionError) as e:
+            return logger.warning(f"{self.serial} screencap failed: {e}")
+        finally:
+            await stream.aclose()
+
+        if not data or not (frame := Frame(data, time.perf_counter() - begin)).width:
+            return logger.warning(f"{self.serial} screencap returned no image")
+        if frame.format == "raw" and frame.offset not in (12, 16):
+            return logger.warning(f"{self.serial} screencap returned malformed raw frame")
+
+        logger.debug(f"{self.serial} screencap {frame} {frame.elapsed * 1000:.1f} ms")
+
+        self.frame = frame
+        return frame
+
+    async def burst(self, count: int, fps: float = 2.0, fmt: "Format" = "png") -> list["Frame"]:
+        begin, frames = time.perf_counter(), []
+
+        for i in range(count):
+            if frame := await self.screencap(fmt):
+                frames.append(frame)
+            if i + 1 < count and (delay := begin + (i + 1) / fps - time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+
+        return frames
+
+    async def screenshot(self, out_dir: str = ".") -> typing.Optional[str]:
+        (out := Path(out_dir)).mkdir(parents=True, exist_ok=True)
+
+        if not (frame := await self.screencap("png")):
+            return None
 
-        cmd = self.prefix + ["shell", "rm", "-f", remote]
-        await Terminal.cmd_line(cmd)
+        local = out / f"screenshot_{time.strftime('%Y%m%d_%H%M%S')}.png"
+        local.write_bytes(frame.png())
 
         return str(local)
 
@@ -0,0 +1,91 @@
+#  _____
+# |  ___| __ __ _ _ __ ___   ___
+# | |_ | '__/ _` | '_ ` _ \ / _ \
+# |  _|| | | (_| | | | | | |  __/
+# |_|  |_|  \__,_|_| |_| |_|\___|
+#
+
+import zlib
+import time
+import struct
+import typing
+import hashlib
+
+Format = typing.Literal["png", "raw"]
+
+
+class Frame(object):
+
+    __slots__ = ("data", "format", "timestamp", "elapsed", "width", "height", "pixel", "offset", "_digest")
+
+    signature = b"\x89PNG\r\n\x1a\n"
+
+    depth = {1: 4, 2: 4, 3: 3, 4: 2, 5: 4}
+
+    def __init__(self, data: bytes, elapsed: float = 0.0) -> None:
+        self.data      = data
+        self.format: Format = "png" if data.startswith(self.signature) else "raw"
+        self.timestamp = time.time()
+        self.elapsed   = elapsed
+
+        self.width, self.height, self.pixel, self.offset = 0, 0, 0, 0
+        self._digest: typing.Optional[str] = None
+
+        if self.format == "png" and len(data) >= 24:
+            self.width, self.height = struct.unpack(">II", data[16:24])
+        elif self.format == "raw" and len(data) >= 12:
+            self.width, self.height, self.pixel = struct.unpack("<III", data[:12])
+            self.offset = len(data) - self.width * self.height * self.depth.get(self.pixel, 4)
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha1(self.view).hexdigest()
+        return self._digest
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.data)[self.offset:] if self.format == "raw" else memoryview(self.data)
+
+    def rgba(self) -> typing.Optional[memoryview]:
+        if self.format != "raw" or self.pixel not in (1, 2) or self.offset not in (12, 16):
+            return None
+        return self.view
+
+    def png(self, level: int = 1) -> bytes:
+        if self.format == "png":
+            return self.data
+
+        if (pixels := self.rgba()) is None:
+            raise ValueError(f"Unsupported raw pixel format {self.pixel} ...")
+
+        stride = self.width * 4
+        scanlines = b"".join(
+            b"\x00" + pixels[row:row + stride] for row in range(0, stride * self.height, stride)
+        )
+
+        def chunk(kind: bytes, body: bytes) -> bytes:
+            return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+        return self.signature + b"".join([
+            chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0)),
+            chunk(b"IDAT", zlib.compress(scanlines, level)),
+            chunk(b"IEND", b""),
+        ])
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "format"  : self.format,
+            "width"   : self.width,
+            "height"  : self.height,
+            "bytes"   : len(self.data),
+            "digest"  : self.digest,
+            "elapsed" : round(self.elapsed, 4),
+        }
+
+    def __repr__(self) -> str:
+        return f"Frame({self.format}, {self.width}x{self.height}, {len(self.data)} bytes)"
+
+
+if __name__ == '__main__':
+    pass
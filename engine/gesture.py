@@ -0,0 +1,246 @@
+#   ____           _
+#  / ___| ___  ___| |_ _   _ _ __ ___
+# | |  _ / _ \/ __| __| | | | '__/ _ \
+# | |_| |  __/\__ \ |_| |_| | | |  __/
+#  \____|\___||___/\__|\__,_|_|  \___|
+#
+
+import re
+import math
+import struct
+import typing
+from loguru import logger
+
+if typing.TYPE_CHECKING:
+    from engine.device import Device
+
+Point    = tuple[float, float]
+Contacts = dict[int, Point]
+Kind     = typing.Literal["swipe", "curve", "fling", "pinch", "multi"]
+
+EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+SYN_REPORT, BTN_TOUCH  = 0x00, 0x14A
+
+ABS_MT_SLOT        = 0x2F
+ABS_MT_TOUCH_MAJOR = 0x30
+ABS_MT_POSITION_X  = 0x35
+ABS_MT_POSITION_Y  = 0x36
+ABS_MT_TRACKING_ID = 0x39
+ABS_MT_PRESSURE    = 0x3A
+
+
+class Touchscreen(object):
+
+    pattern = re.compile(r"\b([0-9a-f]{4})\s*:\s*value -?\d+, min (-?\d+), max (-?\d+)")
+
+    def __init__(self, path: str, axes: dict[int, tuple[int, int]], width: int, height: int, wide: bool) -> None:
+        self.path   = path
+        self.axes   = axes
+        self.width  = width
+        self.height = height
+        self.wide   = wide
+        self.slots  = axes.get(ABS_MT_SLOT, (0, 0))[1] + 1
+
+        self.writable = False
+
+    @staticmethod
+    def parse(getevent: str) -> typing.Optional[tuple[str, dict[int, tuple[int, int]]]]:
+        found, path, axes = [], None, {}
+
+        for line in getevent.splitlines():
+            if line.startswith("add device"):
+                if path:
+                    found.append((path, axes))
+                path, axes = line.split(":", 1)[1].strip(), {}
+            elif path and (m := Touchscreen.pattern.search(line)):
+                axes[int(m.group(1), 16)] = int(m.group(2)), int(m.group(3))
+        if path:
+            found.append((path, axes))
+
+        found = [(path, axes) for path, axes in found if {ABS_MT_POSITION_X, ABS_MT_POSITION_Y} <= axes.keys()]
+        found.sort(key=lambda x: (ABS_MT_SLOT in x[1], ABS_MT_TRACKING_ID in x[1]), reverse=True)
+
+        return found[0] if found else None
+
+    def scale(self, point: Point) -> tuple[int, int]:
+        (x_min, x_max), (y_min, y_max) = self.axes[ABS_MT_POSITION_X], self.axes[ABS_MT_POSITION_Y]
+
+        x = x_min + point[0] * (x_max - x_min + 1) / self.width
+        y = y_min + point[1] * (y_max - y_min + 1) / self.height
+
+        return min(max(int(x), x_min), x_max), min(max(int(y), y_min), y_max)
+
+    def pack(self, events: list[tuple[int, int, int]]) -> str:
+        layout = "<qqHHi" if self.wide else "<llHHi"
+        data = b"".join(struct.pack(layout, 0, 0, kind, code, value) for kind, code, value in events)
+        return "".join(f"\\{byte:o}" for byte in data)
+
+
+class Gesture(object):
+
+    def __init__(self, device: "Device", step: float = 0.008) -> None:
+        self.device   = device
+        self.step     = step
+        self.screen: typing.Optional[Touchscreen] = None
+        self.tracking = 0
+        self.probed   = False
+
+    async def prepare(self) -> typing.Optional[Touchscreen]:
+        if self.probed:
+            return self.screen
+        self.probed = True
+
+        resp = await self.device.shell(
+            "getevent -p; echo @@@; wm size; echo @@@; getprop ro.product.cpu.abi"
+        ) or ""
+        if len(parts := resp.split("@@@")) < 3:
+            return logger.warning(f"{self.device.serial} getevent unavailable, fallback to input")
+
+        size = re.findall(r"(\d+)x(\d+)", parts[1])
+        if not (found := Touchscreen.parse(parts[0])) or not size:
+            return logger.warning(f"{self.device.serial} no multi-touch screen found, fallback to input")
+
+        path, axes = found
+        width, height = map(int, size[-1])
+        self.screen = Touchscreen(path, axes, width, height, "64" in parts[2])
+
+        self.screen.writable = "writable" in (
+            await self.device.shell(f"[ -w {path} ] && echo writable") or ""
+        )
+
+        logger.info(
+            f"{self.device.serial} touchscreen {path} slots={self.screen.slots} "
+            f"{'printf' if self.screen.writable else 'sendevent'} {width}x{height} wide={self.screen.wide}"
+        )
+        return self.screen
+
+    @staticmethod
+    def polyline(points: list[Point], count: int) -> list[Point]:
+        if len(points) == 1:
+            return points * count
+
+        lengths = [0.0]
+        for (x1, y1), (x2, y2) in zip(points, points[1:]):
+            lengths.append(lengths[-1] + math.hypot(x2 - x1, y2 - y1))
+
+        samples, segment = [], 0
+        for i in range(count):
+            target = lengths[-1] * i / (count - 1)
+            while segment < len(points) - 2 and lengths[segment + 1] < target:
+                segment += 1
+            span = (lengths[segment + 1] - lengths[segment]) or 1.0
+            t = (target - lengths[segment]) / span
+            (x1, y1), (x2, y2) = points[segment], points[segment + 1]
+            samples.append((x1 + (x2 - x1) * t, y1 + (y2 - y1) * t))
+
+        return samples
+
+    @staticmethod
+    def bezier(points: list[Point], count: int) -> list[Point]:
+        samples = []
+        for i in range(count):
+            t, layer = i / (count - 1), list(points)
+            while len(layer) > 1:
+                layer = [
+                    (x1 + (x2 - x1) * t, y1 + (y2 - y1) * t) for (x1, y1), (x2, y2) in zip(layer, layer[1:])
+                ]
+            samples.append(layer[0])
+        return samples
+
+    def frames(
+        self,
+        kind: "Kind",
+        points: list[Point],
+        paths: list[list[Point]],
+        duration: float,
+        scale: float
+    ) -> list["Contacts"]:
+
+        count = max(2, round(duration / 1000 / self.step) + 1)
+
+        match kind:
+            case "swipe" | "fling":
+                tracks = [self.polyline(points[:2], count)]
+            case "curve":
+                tracks = [self.bezier(points, count)]
+            case "pinch":
+                (x1, y1), (x2, y2) = points[:2]
+                mx, my = (x1 + x2) / 2, (y1 + y2) / 2
+                tracks = [
+                    self.polyline([(x, y), (mx + (x - mx) * scale, my + (y - my) * scale)], count)
+                    for x, y in points[:2]
+                ]
+            case "multi":
+                tracks = [self.polyline(path, count) for path in paths]
+            case _:
+                raise ValueError(f"Unsupported gesture {kind} ...")
+
+        return [{slot: track[i] for slot, track in enumerate(tracks)} for i in range(count)]
+
+    def encode(self, frames: list["Contacts"]) -> list[list[tuple[int, int, int]]]:
+        screen, previous, packets = self.screen, {}, []
+
+        if len(frames[0]) > min(screen.slots, 5):
+            raise ValueError(f"Gesture needs {len(frames[0])} fingers, touchscreen supports {min(screen.slots, 5)} ...")
+
+        for frame in frames + [{}]:
+            events = []
+            for slot in sorted(previous.keys() | frame.keys()):
+                if ABS_MT_SLOT in screen.axes:
+                    events.append((EV_ABS, ABS_MT_SLOT, slot))
+                if slot not in frame:
+                    events.append((EV_ABS, ABS_MT_TRACKING_ID, -1))
+                    continue
+                if slot not in previous:
+                    self.tracking = (self.tracking + 1) % 0xFFFF
+                    events.append((EV_ABS, ABS_MT_TRACKING_ID, self.tracking))
+                    for code in (ABS_MT_TOUCH_MAJOR, ABS_MT_PRESSURE):
+                        if code in screen.axes:
+                            events.append((EV_ABS, code, max(1, screen.axes[code][1] // 2)))
+                x, y = screen.scale(frame[slot])
+                events += [(EV_ABS, ABS_MT_POSITION_X, x), (EV_ABS, ABS_MT_POSITION_Y, y)]
+
+            if bool(previous) != bool(frame):
+                events.append((EV_KEY, BTN_TOUCH, int(bool(frame))))
+            events.append((EV_SYN, SYN_REPORT, 0))
+
+            packets.append(events)
+            previous = frame
+
+        return packets
+
+    def commands(self, packets: list[list[tuple[int, int, int]]], delay: float) -> list[str]:
+        screen = self.screen
+
+        if screen.writable:
+            commands = [f"printf '{screen.pack(events)}' > {screen.path}" for events in packets]
+        else:
+            commands = [
+                "; ".join(f"sendevent {screen.path} {kind} {code} {value}" for kind, code, value in events)
+                for events in packets
+            ]
+
+        if delay <= 0:
+            return commands
+        return [line for command in commands for line in (command, f"sleep {delay:.3f}")][:-1]
+
+    async def build(
+        self,
+        kind: "Kind",
+        points: typing.Optional[list[Point]] = None,
+        paths: typing.Optional[list[list[Point]]] = None,
+        duration: float = 300,
+        scale: float = 2.0
+    ) -> typing.Optional[list[str]]:
+
+        if not await self.prepare():
+            return None
+
+        frames  = self.frames(kind, points or [], paths or [], duration, scale)
+        packets = self.encode(frames)
+
+        return self.commands(packets, duration / 1000 / (len(frames) - 1))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,203 @@
+#  _   _ _                         _
+# | | | (_) ___ _ __ __ _ _ __ ___| |__  _   _
+# | |_| | |/ _ \ '__/ _` | '__/ __| '_ \| | | |
+# |  _  | |  __/ | | (_| | | | (__| | | | |_| |
+# |_| |_|_|\___|_|  \__,_|_|  \___|_| |_|\__, |
+#                                        |___/
+#
+
+import re
+import time
+import bisect
+import typing
+import hashlib
+import xml.etree.ElementTree as Et
+from utils import const
+
+Match = typing.Literal["exact", "prefix", "regex"]
+
+
+class Node(object):
+
+    __slots__ = ("order", "text", "resource_id", "content_desc", "class_name", "clickable", "bounds")
+
+    pattern = re.compile(r"\[(-?\d+),(-?\d+)]\[(-?\d+),(-?\d+)]")
+
+    def __init__(self, order: int, attrib: dict[str, str]) -> None:
+        self.order        = order
+        self.text         = attrib.get("text", "")
+        self.resource_id  = attrib.get("resource-id", "")
+        self.content_desc = attrib.get("content-desc", "")
+        self.class_name   = attrib.get("class", "")
+        self.clickable    = attrib.get("clickable") == "true"
+
+        matched = self.pattern.match(attrib.get("bounds", ""))
+        self.bounds = tuple(map(int, matched.groups())) if matched else None
+
+    @property
+    def center(self) -> typing.Optional[tuple[int, int]]:
+        if not self.bounds:
+            return None
+        x1, y1, x2, y2 = self.bounds
+        return (x1 + x2) // 2, (y1 + y2) // 2
+
+    def __repr__(self) -> str:
+        return f"Node({self.text!r}, {self.resource_id!r}, {self.content_desc!r}, {self.bounds})"
+
+
+class Snapshot(object):
+
+    fields = {
+        "text"         : "text",
+        "resource-id"  : "resource_id",
+        "resource_id"  : "resource_id",
+        "content-desc" : "content_desc",
+        "content_desc" : "content_desc",
+    }
+
+    def __init__(self, xml: str | bytes) -> None:
+        xml = xml.encode(const.CHARSET) if isinstance(xml, str) else xml
+
+        self.timestamp = time.monotonic()
+        self.digest    = hashlib.sha1(xml).hexdigest()
+
+        self.nodes: list[Node] = []
+        self.index: dict[str, dict[str, list[Node]]] = {
+            "text": {}, "resource_id": {}, "content_desc": {}
+        }
+        self.order: dict[str, list[str]] = {}
+
+        for elem in Et.fromstring(xml).iter("node"):
+            self.nodes.append(node := Node(len(self.nodes), elem.attrib))
+            for field, index in self.index.items():
+                if key := getattr(node, field):
+                    index.setdefault(key, []).append(node)
+
+    def expired(self, ttl: float) -> bool:
+        return time.monotonic() - self.timestamp > ttl
+
+    def keys(self, field: str) -> list[str]:
+        if field not in self.order:
+            self.order[field] = sorted(self.index[field])
+        return self.order[field]
+
+    def find_all(self, by: str, value: str, match: Match = "exact") -> list[Node]:
+        if not (field := self.fields.get(by)):
+            raise ValueError(f"Unsupported attribute {by}")
+
+        index = self.index[field]
+
+        if match == "exact":
+            return index.get(value, [])
+
+        if match == "prefix":
+            keys = self.keys(field)
+            hits = []
+            for i in range(bisect.bisect_left(keys, value), len(keys)):
+                if not keys[i].startswith(value):
+                    break
+                hits += index[keys[i]]
+            return sorted(hits, key=lambda n: n.order)
+
+        pattern = re.compile(value)
+        return sorted(
+            (n for key, nodes in index.items() if pattern.search(key) for n in nodes), key=lambda n: n.order
+        )
+
+    def find(self, by: str, value: str, match: Match = "exact") -> typing.Optional[Node]:
+        return next(iter(self.find_all(by, value, match)), None)
+
+
+class Seeker(object):
+
+    attrs = {"text": "text", "resource_id": "resource-id", "content_desc": "content-desc"}
+
+    def __init__(self, by: str, value: str, match: Match = "exact") -> None:
+        if not (field := Snapshot.fields.get(by)):
+            raise ValueError(f"Unsupported attribute {by}")
+
+        self.attr = self.attrs[field]
+        self.predicate: typing.Callable[[str], typing.Any] = {
+            "exact"  : lambda key: key == value,
+            "prefix" : lambda key: key.startswith(value),
+            "regex"  : re.compile(value).search if match == "regex" else None,
+        }[match]
+
+        self.parser = Et.XMLPullParser(events=("start", "end"))
+        self.count  = 0
+        self.head: typing.Optional[bytes] = b""
+
+    def feed(self, chunk: bytes) -> typing.Optional[Node]:
+        if self.head is not None:
+            self.head += chunk
+            if (start := self.head.find(b"<?xml")) < 0 and (start := self.head.find(b"<hierarchy")) < 0:
+                self.head = self.head[-len(b"<hierarchy"):]
+                return None
+            chunk, self.head = self.head[start:], None
+
+        self.parser.feed(chunk)
+
+        for event, elem in self.parser.read_events():
+            if event == "end":
+                elem.clear(); continue
+            if elem.tag != "node":
+                continue
+
+            self.count += 1
+            if (key := elem.attrib.get(self.attr)) and self.predicate(key):
+                return Node(self.count - 1, elem.attrib)
+
+        return None
+
+
+def benchmark(dumps: list[str], by: str, value: str, rounds: int = 20) -> None:
+    import tracemalloc
+    from pathlib import Path
+
+    def fromstring(xml: bytes) -> typing.Any:
+        attr = Seeker.attrs[Snapshot.fields[by]]
+        for n in Et.fromstring(xml).iter("node"):
+            if n.attrib.get(attr) == value:
+                return n.attrib
+        return None
+
+    def snapshot(xml: bytes) -> typing.Any:
+        return Snapshot(xml).find(by, value)
+
+    def seeker(xml: bytes) -> typing.Any:
+        finder = Seeker(by, value)
+        for offset in range(0, len(xml), 65536):
+            if node := finder.feed(xml[offset:offset + 65536]):
+                return node
+        return None
+
+    for dump in dumps:
+        xml = Path(dump).read_bytes()
+        print(f"{dump} {len(xml)} bytes {by}={value!r}")
+
+        for name, func in (("fromstring", fromstring), ("snapshot", snapshot), ("seeker", seeker)):
+            begin = time.perf_counter()
+            for _ in range(rounds):
+                found = func(xml)
+            cost = (time.perf_counter() - begin) / rounds
+
+            tracemalloc.start()
+            func(xml)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"  {name:<10} {cost * 1000:8.2f} ms {peak / 1024:10.1f} KiB found={found is not None}")
+
+
+if __name__ == '__main__':
+    # python -m engine.hierarchy --by text --value 登录 window_dump_1.xml window_dump_2.xml
+    import argparse
+
+    cmd_parser = argparse.ArgumentParser()
+    cmd_parser.add_argument("dumps", nargs="+")
+    cmd_parser.add_argument("--by", default="text")
+    cmd_parser.add_argument("--value", required=True)
+    cmd_parser.add_argument("--rounds", type=int, default=20)
+    cmd_args = cmd_parser.parse_args()
+
+    benchmark(cmd_args.dumps, cmd_args.by, cmd_args.value, cmd_args.rounds)
@@ -6,43 +6,99 @@
 #                           |___/
 #
 
+import re
 import sys
+import time
 import typing
 import asyncio
 from pathlib import Path
 from loguru import logger
 from engine.device import Device
+from engine.bridge import Bridge
 from engine.terminal import Terminal
 from utils import const
 
 
 class McpServer(object):
 
-    def __init__(self, program: Path | str):
-        self.program = str(program)
+    ready_pattern = re.compile(r"Uvicorn running on|Application startup complete")
+
+    def __init__(
+        self,
+        program: Path | str,
+        host: str = "127.0.0.1",
+        port: int = 3333,
+        deadline: float = 15.0,
+        args: typing.Optional[list[str]] = None
+    ):
+
+        self.program  = str(program)
+        self.args     = args or []
+        self.host     = host
+        self.port     = port
+        self.deadline = deadline
+
         self.transports: typing.Optional[asyncio.subprocess.Process] = None
+        self.ready = asyncio.Event()
+        self.startup: typing.Optional[float] = None
 
     async def input_stream(self) -> None:
         async for line in self.transports.stdout:
-            logger.debug(line.decode(const.CHARSET, const.IGNORE).strip())
+            stream = line.decode(const.CHARSET, const.IGNORE).strip()
+            if self.ready_pattern.search(stream):
+                self.ready.set()
+            logger.debug(stream)
 
     async def error_stream(self) -> None:
         async for line in self.transports.stderr:
-            logger.debug(line.decode(const.CHARSET, const.IGNORE).strip())
+            stream = line.decode(const.CHARSET, const.IGNORE).strip()
+            if self.ready_pattern.search(stream):
+                self.ready.set()
+            logger.debug(stream)
+
+    async def health(self) -> bool:
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            return False
+
+        try:
+            writer.write(
+                f"GET /health HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            return (await asyncio.wait_for(reader.readline(), 1)).split()[1:2] == [b"200"]
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
 
     async def mcp_begin(self) -> None:
         if self.transports and self.transports.returncode is None:
             return None
 
-        cmd = [sys.executable, self.program]  # todo
+        begin = time.perf_counter()
+        self.ready.clear()
+
+        cmd = [sys.executable, self.program] + self.args  # todo
         self.transports = await Terminal.cmd_link(cmd)
 
         asyncio.create_task(self.input_stream())
         asyncio.create_task(self.error_stream())
 
-        await asyncio.sleep(1)
+        while not await self.health():
+            if self.transports.returncode is not None:
+                raise RuntimeError(f"MCP exited with code {self.transports.returncode} ...")
+            if time.perf_counter() - begin > self.deadline:
+                raise RuntimeError(f"MCP not ready within {self.deadline}s ...")
+            try:
+                await asyncio.wait_for(self.ready.wait(), 0.05)
+            except asyncio.TimeoutError:
+                pass
+
+        self.startup = time.perf_counter() - begin
 
-        logger.info(f"Ⓜ️ {const.APP_DESC} MCP started ...")
+        logger.info(f"Ⓜ️ {const.APP_DESC} MCP started in {self.startup:.2f}s ...")
 
     async def mcp_final(self) -> None:
         if not self.transports or self.transports.returncode is not None:
@@ -59,23 +115,222 @@ class McpServer(object):
         logger.info(f"♻️ {const.APP_DESC} MCP stopped ...")
 
 
+class Record(object):
+
+    def __init__(self, serial: str, state: str, device: "Device") -> None:
+        self.serial  = serial
+        self.state   = state
+        self.device  = device
+        self.changed = time.time()
+
+        self.model: typing.Optional[str] = None
+        self.sdk: typing.Optional[int] = None
+        self.size: typing.Optional[tuple[int, int]] = None
+        self.tags: set[str] = set()
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "serial"  : self.serial,
+            "host"    : self.device.host,
+            "state"   : self.state,
+            "model"   : self.model,
+            "sdk"     : self.sdk,
+            "size"    : self.size,
+            "tags"    : sorted(self.tags),
+            "changed" : self.changed,
+        }
+
+
 class Manage(object):
 
-    device_list: list[Device] = []
+    def __init__(
+        self,
+        adb: str,
+        mode: typing.Literal["shell", "spawn", "native"] = "shell",
+        bridge: typing.Optional["Bridge"] = None,
+        interval: float = 2.0,
+        hosts: typing.Optional[list[str]] = None,
+        parse_mode: typing.Literal["index", "stream"] = "index"
+    ) -> None:
 
-    def __init__(self, adb: str) -> None:
-        self.adb = adb
+        self.adb        = adb
+        self.mode       = mode
+        self.interval   = interval
+        self.parse_mode = parse_mode
 
-    async def refresh(self) -> list[Device]:
-        if not self.device_list:
-            self.device_list = await self.devices()
+        self.bridges: dict[str, typing.Optional[Bridge]] = {}
+        for endpoint in hosts or []:
+            host, _, port = endpoint.partition(":")
+            self.bridges[f"{host}:{port or 5037}"] = Bridge(host, int(port or 5037))
+        if not self.bridges:
+            bridge = bridge or (Bridge() if mode == "native" else None)
+            self.bridges[bridge.endpoint if bridge else "local"] = bridge
+
+        self.registry: dict[str, Record] = {}
+        self.watchers: dict[str, asyncio.Task] = {}
+        self.probing: dict[str, asyncio.Task] = {}
+        self.pending = set(self.bridges)
+        self.ready = asyncio.Event()
+
+    @property
+    def device_list(self) -> list[Device]:
+        return [record.device for record in self.registry.values() if record.state == "device"]
+
+    def start(self) -> None:
+        for endpoint in self.bridges:
+            if endpoint not in self.watchers or self.watchers[endpoint].done():
+                self.watchers[endpoint] = asyncio.create_task(self.watch(endpoint))
+
+    async def close(self) -> None:
+        for task in list(self.watchers.values()) + list(self.probing.values()):
+            task.cancel()
+        for record in list(self.registry.values()):
+            await record.device.close()
+        for bridge in self.bridges.values():
+            if bridge:
+                await bridge.close()
+
+    async def refresh(
+        self,
+        devices: typing.Optional[list[str]] = None,
+        tags: typing.Optional[list[str]] = None,
+        shard: typing.Optional[str] = None,
+        timeout: float = 10.0
+    ) -> list[Device]:
+
+        self.start()
+
+        if not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
         if not self.device_list:
             raise RuntimeError("Device not connected ...")
-        return self.device_list
+        if not (device_list := self.select(devices, tags, shard)):
+            raise RuntimeError(f"No connected device matches devices={devices} tags={tags} shard={shard} ...")
+        return device_list
+
+    def lookup(self, targets: list[str]) -> list[Record]:
+        return [
+            record for ident, record in self.registry.items() if ident in targets or record.serial in targets
+        ]
+
+    def select(
+        self,
+        devices: typing.Optional[list[str]] = None,
+        tags: typing.Optional[list[str]] = None,
+        shard: typing.Optional[str] = None
+    ) -> list[Device]:
 
-    async def devices(self) -> list[Device]:
-        resp = await Terminal.cmd_line([self.adb, "devices"])
+        records = [
+            record for record in self.registry.values() if record.state == "device"
+        ] if devices is None else [
+            record for record in self.lookup(devices) if record.state == "device"
+        ]
+
+        if tags:
+            records = [record for record in records if record.tags.intersection(tags)]
+
+        if shard:
+            if not (m := re.fullmatch(r"(\d+)/(\d+)", shard.strip())) or int(m.group(1)) >= int(m.group(2)):
+                raise ValueError(f"Invalid shard {shard}, expected index/count such as 0/2 ...")
+            records = sorted(records, key=lambda r: r.device.ident)[int(m.group(1))::int(m.group(2))]
+
+        return [record.device for record in records]
+
+    def tag(self, targets: list[str], tags: list[str], remove: bool = False) -> list[Record]:
+        for record in (records := self.lookup(targets)):
+            if remove:
+                record.tags.difference_update(tags)
+            else:
+                record.tags.update(tags)
+
+        logger.info(f"🏷️ {'untag' if remove else 'tag'} {[r.device.ident for r in records]} {tags}")
+        return records
+
+    async def watch(self, endpoint: str) -> None:
+        bridge = self.bridges[endpoint]
+
+        while True:
+            if bridge:
+                try:
+                    async for listing in bridge.track():
+                        await self.update(endpoint, listing)
+                except (OSError, ConnectionError, EOFError) as e:
+                    logger.warning(f"adb server {endpoint} track devices interrupted: {e}")
+
+            try:
+                await self.update(endpoint, await self.listing(endpoint))
+            except OSError as e:
+                logger.warning(f"adb server {endpoint} devices unavailable: {e}")
+                self.settle(endpoint)
+            await asyncio.sleep(self.interval)
+
+    def settle(self, endpoint: str) -> None:
+        self.pending.discard(endpoint)
+        if not self.pending:
+            self.ready.set()
+
+    async def update(self, endpoint: str, listing: list[tuple[str, str, dict[str, str]]]) -> None:
+        bridge = self.bridges[endpoint]
+        seen = {serial: (state, extra) for serial, state, extra in listing}
+
+        for serial, (state, extra) in seen.items():
+            ident = f"{endpoint}/{serial}" if bridge else serial
+            if not (record := self.registry.get(ident)):
+                device = Device(self.adb, serial, self.mode, bridge, parse_mode=self.parse_mode)
+                record = self.registry[ident] = Record(serial, state, device)
+                logger.info(f"📱 {ident} attached {state}")
+            elif record.state != state:
+                logger.info(f"📱 {ident} {record.state} -> {state}")
+                record.state, record.changed = state, time.time()
+
+            record.model = record.model or extra.get("model")
+            if state == "device" and record.sdk is None and ident not in self.probing:
+                self.probing[ident] = asyncio.create_task(self.probe(record))
+                self.probing[ident].add_done_callback(lambda _, key=ident: self.probing.pop(key, None))
+
+        for ident, record in list(self.registry.items()):
+            if record.device.host != (endpoint if bridge else None) or record.serial in seen:
+                continue
+            if record.state != "disconnected":
+                logger.info(f"📱 {ident} {record.state} -> disconnected")
+                record.state, record.changed = "disconnected", time.time()
+                record.device.invalidate()
+                await record.device.close()
+
+        self.settle(endpoint)
+
+    @staticmethod
+    async def probe(record: "Record") -> None:
+        resp = await record.device.shell(
+            "getprop ro.product.model; getprop ro.build.version.sdk; wm size"
+        )
+        if not resp or len(lines := [line.strip() for line in resp.splitlines() if line.strip()]) < 3:
+            return None
+
+        record.model = lines[0] or record.model
+        record.sdk   = int(lines[1]) if lines[1].isdigit() else record.sdk
+        if size := re.search(r"(\d+)x(\d+)\s*$", lines[-1]):
+            record.size = int(size.group(1)), int(size.group(2))
+
+        logger.info(f"📱 {record.device.ident} model={record.model} sdk={record.sdk} size={record.size}")
+
+    async def listing(self, endpoint: str) -> list[tuple[str, str, dict[str, str]]]:
+        if bridge := self.bridges[endpoint]:
+            try:
+                return await bridge.devices()
+            except (OSError, ConnectionError) as e:
+                logger.warning(f"adb server {endpoint} unavailable, fallback to adb: {e}")
+
+        cmd = [self.adb] + (["-H", bridge.host, "-P", str(bridge.port)] if bridge else []) + ["devices", "-l"]
+        if (result := await Terminal.cmd_line(cmd)).timeout:
+            raise OSError(f"{' '.join(cmd)} timed out after {result.duration:.1f}s")
+        if result.returncode != 0:
+            return []
+        resp = result.stdout
 
         if not resp or not (lines := [line.strip() for line in resp.splitlines() if line.strip()]):
             return []
@@ -83,7 +338,7 @@ class Manage(object):
         if "not found" in resp.lower() or resp.lower().startswith("adb:") or resp.lower().startswith("error"):
             return []
 
-        device_list: list[Device] = []
+        listing = []
         for line in lines:
             if line.lower().startswith("list of devices"):
                 continue
@@ -91,13 +346,12 @@ class Manage(object):
             if len(parts := line.split()) < 2:
                 continue
 
-            serial, status = parts[0], parts[1]
-            if status != "device":
-                continue
-
-            device_list.append(Device(self.adb, serial))
+            serial, status, *extra = parts
+            listing.append(
+                (serial, status, dict(e.split(":", 1) for e in extra if ":" in e))
+            )
 
-        return device_list
+        return listing
 
 
 if __name__ == '__main__':
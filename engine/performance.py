@@ -5,9 +5,9 @@
 # |_|   \___|_|  |_|  \___/|_|  |_| |_| |_|\__,_|_| |_|\___\___|
 #
 
+import os
 import re
 import time
-import socket
 import typing
 import asyncio
 from loguru import logger
@@ -17,55 +17,160 @@ from utils import const
 
 class Memrix(object):
 
-    __instance: typing.Optional["Memrix"] = None
-    __initialized: bool = False
-
-    def __new__(cls, *args, **kwargs):
-        if not cls.__instance:
-            cls.__instance = super(Memrix, cls).__new__(cls)
-        return cls.__instance
-
-    def __init__(self) -> None:
-        if not self.__initialized:
-            self.transports: typing.Optional[asyncio.subprocess.Process] = None
-            self.token: typing.Optional[str] = None
-
-            self.prefix = "memrix"
-            self.host   = "127.0.0.1"
-            self.port   = 8765
-            self.scene  = time.strftime("%Y%m%d%H%M%S")
-
-        self.__initialized = True
+    stops: dict[tuple[str, int], "Memrix"] = {}
+
+    def __init__(
+        self,
+        serial: typing.Optional[str] = None,
+        adb_host: typing.Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        deadline: float = 30.0
+    ) -> None:
+
+        self.transports: typing.Optional[asyncio.subprocess.Process] = None
+        self.token: typing.Optional[str] = None
+
+        self.serial   = serial
+        self.adb_host = adb_host
+
+        self.prefix = "memrix"
+        self.host   = host
+        self.port   = port
+        self.scene  = time.strftime("%Y%m%d%H%M%S") + ("_" + re.sub(r"\W", "_", serial) if serial else "")
+        self.mode: typing.Optional[typing.Literal["--storm", "--sleek"]] = None
+
+        self.deadline = deadline
+        self.ready    = asyncio.Event()
+        self.startup: typing.Optional[float] = None
+
+        self.subscribers: set[asyncio.Queue] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self.transports) and self.transports.returncode is None
+
+    @property
+    def env(self) -> typing.Optional[dict[str, str]]:
+        if not self.serial:
+            return None
+
+        env = os.environ | {"ANDROID_SERIAL": self.serial}
+        if self.adb_host:
+            host, _, port = self.adb_host.partition(":")
+            env |= {"ANDROID_ADB_SERVER_ADDRESS": host, "ANDROID_ADB_SERVER_PORT": port or "5037"}
+        return env
+
+    def publish(self, stream: str) -> None:
+        for queue in self.subscribers:
+            queue.put_nowait(stream)
+
+    async def follow(self, job: asyncio.Future) -> typing.AsyncIterator[str]:
+        self.subscribers.add(queue := asyncio.Queue())
+        try:
+            while not job.done() or not queue.empty():
+                try:
+                    yield await asyncio.wait_for(queue.get(), 0.2)
+                except asyncio.TimeoutError:
+                    continue
+        finally:
+            self.subscribers.discard(queue)
 
     async def input_stream(self) -> None:
         async for line in self.transports.stdout:
             stream = line.decode(const.CHARSET, const.IGNORE)
             if matched := re.search(r"(?<=Token:\s).*", stream, re.S):
-                self.token = matched.group()
+                self.token = matched.group().strip()
+                self.ready.set()
+            self.publish(stream.strip())
             logger.info(stream)
 
     async def error_stream(self) -> None:
         async for line in self.transports.stderr:
             stream = line.decode(const.CHARSET, const.IGNORE)
+            self.publish(stream.strip())
             logger.info(stream)
 
-    async def engine(self, cmd: list[str]) -> None:
+    async def engine(self, cmd: list[str], watch: bool = False) -> None:
+        if self.running:
+            raise RuntimeError(f"Memrix {self.scene} is still running ...")
+
+        begin = time.perf_counter()
+        self.ready.clear()
+
         cmd = [self.prefix] + cmd
-        self.transports = await Terminal.cmd_link(cmd)
+        self.transports = await Terminal.cmd_link(cmd, self.env)
 
         asyncio.create_task(self.input_stream())
         asyncio.create_task(self.error_stream())
 
-        await asyncio.sleep(5)
-
-    async def task_begin(self, mode: typing.Literal["--storm", "--sleek"], focus: str, imply: str) -> None:
-        cmd = [mode, "--focus", focus, "--scene", self.scene, "--imply", imply, "--watch"]
-        await self.engine(cmd)
+        if not watch:
+            return None
+
+        exited = asyncio.create_task(self.transports.wait())
+        ready  = asyncio.create_task(self.ready.wait())
+        try:
+            await asyncio.wait({exited, ready}, timeout=self.deadline, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            await self.terminate()
+            raise
+        finally:
+            exited.cancel(); ready.cancel()
+
+        if not self.ready.is_set():
+            if self.transports.returncode is not None:
+                raise RuntimeError(f"Memrix exited with code {self.transports.returncode} ...")
+            await self.terminate()
+            raise RuntimeError(f"Memrix not ready within {self.deadline}s ...")
+
+        self.startup = time.perf_counter() - begin
+        logger.info(f"Memrix {self.scene} ready in {self.startup:.2f}s ...")
+
+    async def task_begin(
+        self,
+        mode: typing.Literal["--storm", "--sleek"],
+        focus: str,
+        imply: typing.Optional[str] = None
+    ) -> None:
+
+        if (holder := self.stops.get(stop := (self.host, self.port))) and holder is not self and (
+            holder.transports is None or holder.running
+        ):
+            raise RuntimeError(f"Memrix stop port {self.host}:{self.port} is held by scene {holder.scene} ...")
+        self.stops[stop] = self
+
+        cmd = [mode, "--focus", focus, "--scene", self.scene] + (["--imply", imply] if imply else []) + ["--watch"]
+        try:
+            await self.engine(cmd, watch=True)
+        except BaseException:
+            self.stops.pop(stop, None)
+            raise
+        self.mode = mode
+
+    async def terminate(self) -> None:
+        if not self.running:
+            return None
+
+        self.transports.terminate()
+        try:
+            await asyncio.wait_for(self.transports.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            self.transports.kill()
+            await self.transports.wait()
 
     async def task_final(self) -> None:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((self.host, self.port))
-            s.sendall(self.token.encode(const.CHARSET))
+        if not self.running:
+            return None
+        if not self.token:
+            return await self.terminate()
+
+        _, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(self.token.encode(const.CHARSET))
+            await writer.drain()
+        finally:
+            writer.close()
+            await writer.wait_closed()
 
         await self.transports.wait()
 
@@ -0,0 +1,248 @@
+#  ____                        _
+# / ___|  __ _ _ __ ___  _ __ | | ___ _ __
+# \___ \ / _` | '_ ` _ \| '_ \| |/ _ \ '__|
+#  ___) | (_| | | | | | | |_) | |  __/ |
+# |____/ \__,_|_| |_| |_| .__/|_|\___|_|
+#                       |_|
+#
+
+import re
+import csv
+import time
+import array
+import bisect
+import typing
+import asyncio
+from pathlib import Path
+from loguru import logger
+from engine.shell import Shell
+
+if typing.TYPE_CHECKING:
+    from engine.device import Device
+
+
+class Ring(object):
+
+    __slots__ = ("data", "head", "size")
+
+    def __init__(self, typecode: str, capacity: int) -> None:
+        self.data = array.array(typecode, [0]) * capacity
+        self.head = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, value: float) -> None:
+        self.data[self.head] = value
+        self.head = (self.head + 1) % len(self.data)
+        self.size = min(self.size + 1, len(self.data))
+
+    def values(self) -> list[float]:
+        if self.size < len(self.data):
+            return self.data[:self.size].tolist()
+        return (self.data[self.head:] + self.data[:self.head]).tolist()
+
+
+class Sampler(object):
+
+    columns = {
+        "timestamp" : "d",
+        "cpu"       : "f",
+        "threads"   : "l",
+        "pss"       : "l",
+        "java_heap" : "l",
+        "native"    : "l",
+        "frames"    : "l",
+        "janky"     : "l",
+        "frame_avg" : "f",
+        "frame_max" : "f",
+    }
+
+    clock_tick = 100
+    jank_ms    = 1000 / 60
+
+    def __init__(self, device: "Device", package: str, interval: float = 1.0, capacity: int = 3600) -> None:
+        self.device   = device
+        self.package  = package
+        self.interval = interval
+
+        self.rings: dict[str, Ring] = {
+            column: Ring(typecode, capacity) for column, typecode in self.columns.items()
+        }
+
+        self.session = Shell(device.prefix) if device.mode != "native" else None
+        self.task: typing.Optional[asyncio.Task] = None
+
+        self.pid: typing.Optional[str] = None
+        self.ticks: typing.Optional[tuple[float, int]] = None
+        self.vsync = 0
+        self.cost  = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.task) and not self.task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self.task = asyncio.create_task(self.loop())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self.session:
+            await self.session.close()
+
+    async def shell(self, script: str) -> str:
+        if self.session:
+            _, output = await self.session.execute(script, self.interval * 10)
+            return output
+        return await asyncio.wait_for(
+            self.device.bridge.shell(self.device.serial, script), self.interval * 10
+        )
+
+    async def loop(self) -> None:
+        while True:
+            begin = time.perf_counter()
+            try:
+                await self.sample()
+            except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                logger.warning(f"{self.device.serial} sampler {self.package} failed: {e}")
+            self.cost = time.perf_counter() - begin
+            await asyncio.sleep(max(0.0, self.interval - self.cost))
+
+    async def sample(self) -> None:
+        resp = await self.shell(
+            f"pid=$(pidof -s {self.package}); echo $pid; cat /proc/$pid/stat; echo @@@; "
+            f"dumpsys meminfo {self.package}; echo @@@; dumpsys gfxinfo {self.package} framestats"
+        )
+        stamp = time.time()
+
+        if len(parts := resp.split("@@@")) < 3 or not (head := parts[0].strip().split("\n", 1))[0].isdigit():
+            self.pid, self.ticks = None, None
+            return logger.debug(f"{self.device.serial} sampler {self.package} not running")
+
+        if head[0] != self.pid:
+            self.pid, self.ticks, self.vsync = head[0], None, 0
+
+        cpu, threads = self.parse_stat(stamp, head[1] if len(head) > 1 else "")
+        pss, java, native = self.parse_meminfo(parts[1])
+        frames = self.parse_framestats(parts[2])
+
+        row = {
+            "timestamp" : stamp,
+            "cpu"       : cpu,
+            "threads"   : threads,
+            "pss"       : pss,
+            "java_heap" : java,
+            "native"    : native,
+            "frames"    : len(frames),
+            "janky"     : sum(frame > self.jank_ms for frame in frames),
+            "frame_avg" : sum(frames) / len(frames) if frames else 0.0,
+            "frame_max" : max(frames, default=0.0),
+        }
+        for column, value in row.items():
+            self.rings[column].append(value)
+
+    def parse_stat(self, stamp: float, stat: str) -> tuple[float, int]:
+        if len(fields := stat.rsplit(")", 1)[-1].split()) < 18:
+            return 0.0, 0
+
+        ticks, threads = int(fields[11]) + int(fields[12]), int(fields[17])
+
+        cpu = 0.0
+        if self.ticks and stamp > self.ticks[0]:
+            cpu = (ticks - self.ticks[1]) / self.clock_tick / (stamp - self.ticks[0]) * 100
+        self.ticks = stamp, ticks
+
+        return round(cpu, 2), threads
+
+    @staticmethod
+    def parse_meminfo(meminfo: str) -> tuple[int, int, int]:
+        def find(pattern: str) -> int:
+            return int(m.group(1).replace(",", "")) if (m := re.search(pattern, meminfo, re.M)) else 0
+
+        return (
+            find(r"TOTAL PSS:\s*([\d,]+)") or find(r"^\s*TOTAL\s+([\d,]+)"),
+            find(r"Java Heap:\s*([\d,]+)"),
+            find(r"Native Heap:\s*([\d,]+)"),
+        )
+
+    def parse_framestats(self, gfxinfo: str) -> list[float]:
+        frames, header = [], None
+
+        for line in gfxinfo.splitlines():
+            if line.startswith("Flags,"):
+                header = line.rstrip(",").split(",")
+                if not {"IntendedVsync", "FrameCompleted"} <= set(header):
+                    return frames
+                intended, completed = header.index("IntendedVsync"), header.index("FrameCompleted")
+                continue
+            if not header or not line[:1].isdigit():
+                continue
+            if len(cells := line.rstrip(",").split(",")) < len(header) or cells[0] != "0":
+                continue
+            if (vsync := int(cells[intended])) <= self.vsync:
+                continue
+            self.vsync = vsync
+            frames.append((int(cells[completed]) - vsync) / 1e6)
+
+        return frames
+
+    def rows(self, since: typing.Optional[float] = None, last: typing.Optional[int] = None) -> dict[str, list]:
+        columns = {
+            column: [round(value, 3) for value in ring.values()] if self.columns[column] == "f" else ring.values()
+            for column, ring in self.rings.items()
+        }
+
+        start = bisect.bisect_left(columns["timestamp"], since) if since else 0
+        if last:
+            start = max(start, len(columns["timestamp"]) - last)
+        columns = {column: values[start:] for column, values in columns.items()}
+
+        actions = list(self.device.actions)
+        starts  = [action[0] for action in actions]
+        columns["action"] = [
+            actions[i - 1][2] if (i := bisect.bisect_right(starts, stamp)) else None
+            for stamp in columns["timestamp"]
+        ]
+
+        return columns
+
+    def summary(self, columns: dict[str, list]) -> list[dict[str, typing.Any]]:
+        groups: dict[str, list[int]] = {}
+        for i, action in enumerate(columns["action"]):
+            if action:
+                groups.setdefault(action, []).append(i)
+
+        return [
+            {
+                "action"    : action,
+                "samples"   : len(index),
+                "cpu_avg"   : round(sum(columns["cpu"][i] for i in index) / len(index), 2),
+                "pss_max"   : max(columns["pss"][i] for i in index),
+                "frames"    : sum(columns["frames"][i] for i in index),
+                "janky"     : sum(columns["janky"][i] for i in index),
+                "frame_max" : round(max(columns["frame_max"][i] for i in index), 2),
+            } for action, index in groups.items()
+        ]
+
+    def export(self, folder: Path | str, columns: dict[str, list]) -> str:
+        (folder := Path(folder)).mkdir(parents=True, exist_ok=True)
+
+        name = re.sub(r"\W", "_", self.device.ident)
+        path = folder / f"{name}_{self.package}_{time.strftime('%Y%m%d%H%M%S')}.csv"
+        with path.open("w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns.keys())
+            writer.writerows(zip(*columns.values()))
+
+        return str(path)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,128 @@
+#  ____       _              _       _
+# / ___|  ___| |__   ___  __| |_   _| | ___ _ __
+# \___ \ / __| '_ \ / _ \/ _` | | | | |/ _ \ '__|
+#  ___) | (__| | | |  __/ (_| | |_| | |  __/ |
+# |____/ \___|_| |_|\___|\__,_|\__,_|_|\___|_|
+#
+
+import time
+import typing
+import asyncio
+from engine.device import Device
+from utils.metrics import Metrics
+
+
+class Scheduler(object):
+
+    def __init__(self, concurrency: int = 16, depth: int = 64, host_limit: int = 8) -> None:
+        self.depth = depth
+        self.gate  = asyncio.Semaphore(concurrency)
+
+        self.host_limit = host_limit
+        self.host_gates: dict[str, asyncio.Semaphore] = {}
+
+        self.queues: dict[str, asyncio.Queue] = {}
+        self.workers: dict[str, asyncio.Task] = {}
+        self.metrics: dict[str, dict[str, float]] = {}
+
+    def submit(
+        self,
+        device: "Device",
+        factory: typing.Callable[[], typing.Awaitable],
+        label: typing.Optional[str] = None
+    ) -> asyncio.Future:
+
+        if (ident := device.ident) not in self.queues:
+            self.queues[ident]  = asyncio.Queue(self.depth)
+            self.metrics[ident] = {"done": 0, "waited": 0.0, "waited_max": 0.0}
+
+        if ident not in self.workers or self.workers[ident].done():
+            if device.host:
+                host_gate = self.host_gates.setdefault(device.host, asyncio.Semaphore(self.host_limit))
+                device.gates = host_gate, self.gate
+            else:
+                device.gates = self.gate,
+            self.workers[ident] = asyncio.create_task(self.work(ident, device))
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queues[ident].put_nowait((factory, future, time.perf_counter(), label))
+        except asyncio.QueueFull:
+            raise RuntimeError(f"{ident} command queue full ({self.depth}), retry later ...")
+
+        return future
+
+    async def work(self, ident: str, device: "Device") -> None:
+        queue, metrics = self.queues[ident], self.metrics[ident]
+
+        while True:
+            factory, future, enqueued, label = await queue.get()
+            try:
+                if future.done():
+                    continue
+
+                waited = time.perf_counter() - enqueued
+                metrics["done"] += 1
+                metrics["waited"] += waited
+                metrics["waited_max"] = max(metrics["waited_max"], waited)
+
+                started = time.time()
+                try:
+                    job = asyncio.ensure_future(factory())
+                    future.add_done_callback(lambda f, j=job: j.cancel() if f.cancelled() else None)
+                    result = await job
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                except Exception as e:
+                    future.done() or future.set_exception(e)
+                else:
+                    future.done() or future.set_result(result)
+                finally:
+                    if label:
+                        device.actions.append((started, finished := time.time(), label))
+                        Metrics.observe(f"job.{label}", ident, finished - started)
+            finally:
+                queue.task_done()
+
+    async def fan_out(
+        self,
+        device_list: list["Device"],
+        factory: typing.Callable[["Device"], typing.Awaitable],
+        label: typing.Optional[str] = None
+    ) -> list[typing.Any]:
+
+        async def queued(device: "Device", enqueued: float) -> typing.Any:
+            waited = time.perf_counter() - enqueued
+            result = await factory(device)
+            return result | {"queued": round(waited, 4)} if isinstance(result, dict) else result
+
+        futures = []
+        try:
+            for device in device_list:
+                futures.append(self.submit(device, lambda d=device, t=time.perf_counter(): queued(d, t), label))
+        except RuntimeError:
+            for future in futures:
+                future.cancel()
+            raise
+
+        return list(await asyncio.gather(*futures))
+
+    def stats(self, ident: str) -> dict[str, typing.Any]:
+        if not (metrics := self.metrics.get(ident)):
+            return {"depth": 0, "done": 0, "waited_avg": 0.0, "waited_max": 0.0}
+
+        return {
+            "depth"      : self.queues[ident].qsize(),
+            "done"       : metrics["done"],
+            "waited_avg" : round(metrics["waited"] / metrics["done"], 4) if metrics["done"] else 0.0,
+            "waited_max" : round(metrics["waited_max"], 4),
+        }
+
+    async def close(self) -> None:
+        for worker in self.workers.values():
+            worker.cancel()
+
+
+if __name__ == '__main__':
+    pass
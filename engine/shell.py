@@ -0,0 +1,75 @@
+#  ____  _          _ _
+# / ___|| |__   ___| | |
+# \___ \| '_ \ / _ \ | |
+#  ___) | | | |  __/ | |
+# |____/|_| |_|\___|_|_|
+#
+
+import uuid
+import typing
+import asyncio
+from engine.terminal import Terminal
+from utils import const
+
+
+class Shell(object):
+
+    def __init__(self, prefix: list[str], timeout: float = 30.0) -> None:
+        self.prefix  = prefix
+        self.timeout = timeout
+
+        self.transports: typing.Optional[asyncio.subprocess.Process] = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.transports and self.transports.returncode is None)
+
+    async def connect(self) -> None:
+        if self.alive:
+            return None
+
+        self.transports = await Terminal.cmd_pipe(self.prefix + ["shell"])
+
+    async def close(self) -> None:
+        if not self.alive:
+            return None
+
+        self.transports.stdin.close()
+        Terminal.kill(self.transports)
+        await self.transports.wait()
+
+    async def request(self, command: str) -> tuple[int, str]:
+        token = f"__{const.APP_NAME.upper()}_{uuid.uuid4().hex}__"
+
+        payload = f"{{ {command}\n}} 2>&1; printf '\\n%s %s\\n' {token} \"$?\"\n"
+        self.transports.stdin.write(payload.encode(const.CHARSET))
+        await self.transports.stdin.drain()
+
+        lines: list[bytes] = []
+        while line := await self.transports.stdout.readline():
+            if line.startswith(token.encode(const.CHARSET)):
+                code = line.split()[-1].decode(const.CHARSET, const.IGNORE)
+                return int(code) if code.isdigit() else -1, b"".join(lines).decode(
+                    const.CHARSET, const.IGNORE
+                ).strip()
+            lines.append(line)
+
+        raise ConnectionResetError(f"Shell closed {' '.join(self.prefix)}")
+
+    async def execute(self, command: str, timeout: typing.Optional[float] = None) -> tuple[int, str]:
+        async with self.lock:
+            for retry in range(2):
+                await self.connect()
+                try:
+                    return await asyncio.wait_for(self.request(command), timeout or self.timeout)
+                except (ConnectionError, BrokenPipeError):
+                    await self.close()
+                    if retry: raise
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    await self.close()
+                    raise
+
+
+if __name__ == '__main__':
+    pass
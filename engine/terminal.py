@@ -5,32 +5,123 @@
 #   |_|\___|_|  |_| |_| |_|_|_| |_|\__,_|_|
 #
 
+import os
+import sys
+import time
+import signal
 import typing
+import subprocess
 import asyncio
 from utils import const
+from utils.metrics import Metrics
+
+
+class Result(object):
+
+    def __init__(
+        self,
+        returncode: typing.Optional[int],
+        stdout: str,
+        stderr: str,
+        duration: float,
+        timeout: bool = False
+    ) -> None:
+
+        self.returncode = returncode
+        self.stdout     = stdout
+        self.stderr     = stderr
+        self.duration   = duration
+        self.timeout    = timeout
+
+    @property
+    def output(self) -> typing.Optional[str]:
+        return self.stdout or self.stderr or None
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "returncode" : self.returncode,
+            "stdout"     : self.stdout,
+            "stderr"     : self.stderr,
+            "duration"   : round(self.duration, 4),
+            "timeout"    : self.timeout,
+        }
+
+    def __repr__(self) -> str:
+        return f"Result(returncode={self.returncode}, duration={self.duration:.3f}, timeout={self.timeout})"
 
 
 class Terminal(object):
 
+    timeout: float = 30.0
+
+    group = {"start_new_session": True} if sys.platform != "win32" else {
+        "creationflags": getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
+    }
+
+    @staticmethod
+    def kill(transports: asyncio.subprocess.Process) -> None:
+        if transports.returncode is not None:
+            return None
+
+        try:
+            if sys.platform != "win32":
+                os.killpg(transports.pid, signal.SIGKILL)
+            else:
+                transports.kill()
+        except (ProcessLookupError, PermissionError):
+            transports.kill()
+
+    @staticmethod
+    async def cmd_line(
+        cmd: list[str], timeout: typing.Optional[float] = None, ident: typing.Optional[str] = None
+    ) -> "Result":
+
+        with Metrics.span("cmd_line", ident):
+            begin = time.perf_counter()
+
+            transports = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                **Terminal.group
+            )
+
+            try:
+                stdout, stderr = await asyncio.wait_for(
+                    transports.communicate(), timeout or Terminal.timeout
+                )
+            except asyncio.TimeoutError:
+                Terminal.kill(transports)
+                await transports.wait()
+                return Result(
+                    transports.returncode, "", f"Timeout {' '.join(map(str, cmd))}", time.perf_counter() - begin, True
+                )
+            except asyncio.CancelledError:
+                Terminal.kill(transports)
+                await transports.wait()
+                raise
+
+            return Result(
+                transports.returncode,
+                stdout.decode(const.CHARSET, const.IGNORE).strip(),
+                stderr.decode(const.CHARSET, const.IGNORE).strip(),
+                time.perf_counter() - begin
+            )
+
     @staticmethod
-    async def cmd_line(cmd: list[str]) -> typing.Any:
+    async def cmd_link(cmd: list[str], env: typing.Optional[dict[str, str]] = None) -> asyncio.subprocess.Process:
         transports = await asyncio.create_subprocess_exec(
             *cmd,
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env
         )
 
-        stdout, stderr = await transports.communicate()
-
-        if stdout:
-            return stdout.decode(const.CHARSET, const.IGNORE).strip()
-        if stderr:
-            return stderr.decode(const.CHARSET, const.IGNORE).strip()
+        return transports
 
     @staticmethod
-    async def cmd_link(cmd: list[str]) -> asyncio.subprocess.Process:
+    async def cmd_pipe(cmd: list[str]) -> asyncio.subprocess.Process:
         transports = await asyncio.create_subprocess_exec(
             *cmd,
-            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            limit=const.STREAM_LIMIT, **Terminal.group
         )
 
         return transports
@@ -1,29 +1,35 @@
+from utils.profile import Profile
+
 import re
 import sys
+import json
+import time
 import signal
 import typing
 import asyncio
+import contextlib
 from pathlib import Path
 from loguru import logger
-from rich.prompt import Prompt
-from mcp import (
-    ClientSession, ListToolsResult
-)
-from mcp.client.streamable_http import streamable_http_client
-from engine.design import Design
+from engine.channel import Channel
 from engine.manage import McpServer
 from engine.terminal import Terminal
-from engine.tinker import Active
 from utils import request
+from utils.cache import PlanCache
+
+plan_cache = PlanCache()
 
 
 def signal_processor(*_, **__) -> None:
+    from engine.design import Design
+
     Design.console.print()
     logger.info(f"📞 Received signal {signal.SIGINT} ...")
     sys.exit(0)
 
 
 async def mind_boot() -> McpServer:
+    from engine.tinker import Active
+
     Active.active("DEBUG")
 
     root = Path(__file__).parent
@@ -35,10 +41,18 @@ async def mind_boot() -> McpServer:
     if sys.platform == "darwin":
         await Terminal.cmd_line(["chmod", "+x", program])
 
-    return McpServer(program)
+    # python mind.py --adb-host=192.168.1.20:5037 --adb-host=192.168.1.21:5037
+    # python mind.py --parse-mode=stream
+    args = [
+        arg for arg in sys.argv[1:]
+        if arg.startswith("--adb-host=") or arg in ("--profile-startup", "--no-metrics", "--parse-mode=stream")
+    ]
+
+    return McpServer(program, args=args)
 
 
 async def mind_trip(
+    channel: "Channel",
     message: str,
     model: typing.Union[
         str,
@@ -56,51 +70,125 @@ async def mind_trip(
             "openai/gpt-oss-20b",
             "qwen/qwen3-32b",
         ],
-    ] = "llama-3.3-70b-versatile"
+    ] = "llama-3.3-70b-versatile",
+    use_cache: bool = True
 ) -> None:
 
-    async def exec_looper() -> None:
-        for i in range(plan.get("loop_count", 1)):
-            for step in steps:
-                action = step["action"]
-                result = await session.call_tool(action["action"], action["args"])
+    async def exec_step(step: dict) -> bool:
+        nonlocal first_action
 
-                if result.isError: return logger.error(result.content[0].text)
-                else: logger.info(f"{result.content[0].text}")
+        if first_action is None:
+            first_action = time.perf_counter() - begin
+            logger.info(f"⏱️ First action after {first_action:.2f}s")
 
-    async with streamable_http_client("http://127.0.0.1:3333/mcp") as (r, w, _):
-        async with ClientSession(r, w) as session:
-            await session.initialize()
+        action = step["action"]
+        result = await channel.call_tool(action["action"], action["args"])
 
-            list_tools: ListToolsResult = await session.list_tools()
+        if result.isError: logger.error(result.content[0].text)
+        else: logger.info(f"{result.content[0].text}")
 
-            openai_tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description" : tool.description,
-                        "parameters"  : tool.inputSchema
-                    }
-                }
-                for tool in list_tools.tools
-            ]
+        return not result.isError
 
-            for tool in openai_tools: logger.debug(f"⚙️ Tool {tool['function']['name']}")
+    async def exec_looper(steps: list[dict], loop_count: int) -> bool:
+        if "run_batch" in tool_names:
+            result = await channel.call_tool(
+                "run_batch", {"steps": steps, "loop_count": loop_count}
+            )
 
-            payload = {"model": model, "message": message, "tools": openai_tools}
+            if result.isError:
+                logger.error(result.content[0].text); return False
 
-            async for plan in request.stream_planner(payload):
-                if not (steps := plan.get("steps")):
+            success = True
+            for content in result.content:
+                logger.info(f"{content.text}")
+                try:
+                    success = success and not json.loads(content.text).get("error")
+                except (json.JSONDecodeError, AttributeError):
                     continue
-                await exec_looper()
+            return success
+
+        for i in range(loop_count):
+            for step in steps:
+                if not await exec_step(step):
+                    return False
+        return True
+
+    async def producer() -> None:
+        try:
+            async for event in request.stream_planner(payload):
+                await queue.put(event)
+        except Exception:
+            await queue.put(None); raise
+        await queue.put(None)
+
+    async def consumer() -> bool:
+        steps, done = [], 0
+
+        while (event := await queue.get()) is not None:
+            match event.get("type"):
+                case "step" if event.get("step"):
+                    steps.append(event["step"])
+                case "plan" if event.get("steps"):
+                    steps = event["steps"]
+                case _:
+                    continue
+
+            for step in steps[done:]:
+                if not await exec_step(step):
+                    return False
+                done += 1
+
+            if event.get("type") == "plan":
+                if (loop_count := event.get("loop_count", 1)) > 1 and not await exec_looper(steps, loop_count - 1):
+                    return False
+                plans.append({"steps": steps, "loop_count": loop_count})
+                steps, done = [], 0
+
+        return True
+
+    begin, first_action = time.perf_counter(), None
+    plans: list[dict] = []
+    queue: asyncio.Queue[typing.Optional[dict]] = asyncio.Queue(maxsize=16)
 
+    openai_tools = await channel.list_openai_tools()
+
+    tool_names = {tool["function"]["name"] for tool in openai_tools}
+
+    cache_key = PlanCache.key(message, model, openai_tools)
+
+    if use_cache and (cached := plan_cache.get(cache_key)):
+        logger.info(f"🗂️ Replay cached plan after {time.perf_counter() - begin:.2f}s hit_rate={plan_cache.hit_rate:.1%}")
+        for plan in cached:
+            for step in plan["steps"]: logger.info(f"🟠 Plan {step['action']}")
+            if not await exec_looper(plan["steps"], plan.get("loop_count", 1)):
+                return plan_cache.evict(cache_key)
+        return None
+
+    payload = {"model": model, "message": message, "tools": openai_tools}
+
+    planner = asyncio.create_task(producer())
+    try:
+        if not await consumer():
+            logger.warning(f"🛑 Step failed, planner stream cancelled ...")
+        elif use_cache:
+            plan_cache.put(cache_key, plans)
+    finally:
+        if not planner.done():
+            planner.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await planner
+
+
+async def mind_loop(channel: "Channel") -> None:
+    from rich.prompt import Prompt
+    from engine.design import Design
 
-async def mind_loop() -> None:
     doc = """\
     /help              显示帮助
     /quit              退出
     /repeat N <goal>   将目标重复执行 N 次
+    /nocache <goal>    跳过规划缓存，重新规划
+    /cache [clear]     查看规划缓存命中率 / 清空缓存
     /tools             查看可用工具（如果你有输出方法）
     """
 
@@ -110,26 +198,49 @@ async def mind_loop() -> None:
         if raw.strip() in {"/help", "help"}:
             Design.console.print(doc); continue
 
+        if raw.strip() == "/cache":
+            Design.Doc.log(plan_cache.stats()); continue
+
+        if raw.strip() == "/cache clear":
+            plan_cache.clear(); Design.Doc.suc("Plan cache cleared"); continue
+
+        if m := re.match(r"^/nocache\s+(.+)$", raw.strip()):
+            await mind_trip(channel, m.group(1), use_cache=False); continue
+
         if m := re.match(r"^/repeat\s+(\d+)\s+(.+)$", raw.strip()):
-            await mind_trip(f"{m.group(2)}，循环 {int(m.group(1))} 次"); continue
+            await mind_trip(channel, f"{m.group(2)}，循环 {int(m.group(1))} 次"); continue
 
-        await mind_trip(raw)
+        await mind_trip(channel, raw)
 
 
 async def main() -> None:
     # nuitka --macos-create-app-bundle --show-progress --output-dir=applications agent/mcp_server.py
     # nuitka --mode=standalone --product-name=Mind --product-version=1.0.0 --windows-icon-from-ico=schematic/resources/icons/butterfly.ico --show-progress --show-memory --assume-yes-for-downloads --output-dir=applications agent/mcp_server.py
+    # python mind.py --profile-startup
     # lsof -ti :3333 | xargs kill -9
     # Get-NetTCPConnection -LocalPort 3333 | ForEach-Object { Stop-Process -Id $_.OwningProcess -Force }
 
     server = await mind_boot()
 
     await server.mcp_begin()
+
+    if Profile.enabled():
+        logger.info(Profile.report("mind", "mind", {
+            "mcp server ready": server.startup, "time to ready": Profile.elapsed()
+        }))
+        return await server.mcp_final()
+
     signal.signal(signal.SIGINT, signal_processor)
 
-    try: await mind_loop()
+    channel = Channel()
+    channel.warm()
+
+    try: await mind_loop(channel)
     except Exception as e: logger.error(e); raise e
-    finally: await server.mcp_final()
+    finally:
+        await channel.close()
+        await request.Pool.close()
+        await server.mcp_final()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,115 @@
+#   ____           _
+#  / ___|__ _  ___| |__   ___
+# | |   / _` |/ __| '_ \ / _ \
+# | |__| (_| | (__| | | |  __/
+#  \____\__,_|\___|_| |_|\___|
+#
+
+import re
+import json
+import time
+import typing
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from loguru import logger
+from utils import const
+
+
+class PlanCache(object):
+
+    def __init__(
+        self,
+        folder: typing.Optional[Path | str] = None,
+        capacity: int = 64,
+        ttl: float = 7 * 24 * 3600,
+        enabled: bool = True
+    ) -> None:
+
+        self.folder   = Path(folder or Path.home() / f".{const.APP_NAME}" / "plans")
+        self.capacity = capacity
+        self.ttl      = ttl
+        self.enabled  = enabled
+
+        self.front: OrderedDict[str, dict[str, typing.Any]] = OrderedDict()
+        self.hits   = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(goal: str, model: str, tools: list[dict]) -> str:
+        schema = hashlib.sha256(
+            json.dumps(tools, sort_keys=True, ensure_ascii=False).encode(const.CHARSET)
+        ).hexdigest()
+        normalized = re.sub(r"\s+", " ", goal).strip().lower()
+
+        return hashlib.sha256(
+            json.dumps([normalized, model, schema], ensure_ascii=False).encode(const.CHARSET)
+        ).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / total if (total := self.hits + self.misses) else 0.0
+
+    def stats(self) -> dict[str, typing.Any]:
+        return {
+            "hits"     : self.hits,
+            "misses"   : self.misses,
+            "hit_rate" : round(self.hit_rate, 4),
+            "memory"   : len(self.front),
+            "disk"     : len(list(self.folder.glob("*.json"))) if self.folder.exists() else 0,
+        }
+
+    def remember(self, key: str, entry: dict[str, typing.Any]) -> None:
+        self.front[key] = entry
+        self.front.move_to_end(key)
+        while len(self.front) > self.capacity:
+            self.front.popitem(last=False)
+
+    def get(self, key: str) -> typing.Optional[list[dict]]:
+        if not self.enabled:
+            return None
+
+        if not (entry := self.front.get(key)):
+            try:
+                entry = json.loads((self.folder / f"{key}.json").read_text(const.CHARSET))
+            except (OSError, json.JSONDecodeError):
+                entry = None
+
+        if entry and time.time() - entry["created"] > self.ttl:
+            self.evict(key); entry = None
+
+        if not entry:
+            self.misses += 1
+            logger.debug(f"🗂️ Plan cache miss hit_rate={self.hit_rate:.1%}")
+            return None
+
+        self.hits += 1
+        self.remember(key, entry)
+        logger.debug(f"🗂️ Plan cache hit hit_rate={self.hit_rate:.1%}")
+        return entry["plans"]
+
+    def put(self, key: str, plans: list[dict]) -> None:
+        if not self.enabled or not plans:
+            return None
+
+        self.remember(key, entry := {"created": time.time(), "plans": plans})
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            (self.folder / f"{key}.json").write_text(
+                json.dumps(entry, ensure_ascii=False), const.CHARSET
+            )
+        except OSError as e:
+            logger.warning(f"🗂️ Plan cache write failed: {e}")
+
+    def evict(self, key: str) -> None:
+        self.front.pop(key, None)
+        (self.folder / f"{key}.json").unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        self.front.clear()
+        for file in self.folder.glob("*.json"):
+            file.unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    pass
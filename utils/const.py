@@ -15,10 +15,14 @@ APP_LICENSE = r"Proprietary License"
 CHARSET     = r"UTF-8"
 IGNORE      = "ignore"
 
+STREAM_LIMIT = 16 * 1024 * 1024
+
 AUTHOR  = r"AceKeppel"
 EMAIL   = r"AceKeppel@outlook.com"
 APP_URL = r"https://github.com/PlaxtonFlarion/SoftwareCenter"
 
+PLANNER_URL = r"https://api.appserverx.com/planner"
+
 PUBLISHER = f"{APP_DESC} Technologies Inc."
 COPYRIGHT = f"Copyright (C) {APP_YEAR} {APP_DESC}. All rights reserved."
 
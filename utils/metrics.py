@@ -0,0 +1,145 @@
+#  __  __      _        _
+# |  \/  | ___| |_ _ __(_) ___ ___
+# | |\/| |/ _ \ __| '__| |/ __/ __|
+# | |  | |  __/ |_| |  | | (__\__ \
+# |_|  |_|\___|\__|_|  |_|\___|___/
+#
+
+import time
+import array
+import bisect
+import typing
+import functools
+import contextlib
+
+
+class Histogram(object):
+
+    __slots__ = ("counts", "total", "count", "peak")
+
+    bounds = tuple(0.00005 * 2 ** (i / 2) for i in range(42))
+
+    def __init__(self) -> None:
+        self.counts = array.array("L", [0]) * (len(self.bounds) + 1)
+        self.total  = 0.0
+        self.count  = 0
+        self.peak   = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.peak   = max(self.peak, seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        bounds, target, seen = self.bounds, q * self.count, 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                lower = bounds[i - 1] if i else 0.0
+                upper = bounds[i] if i < len(bounds) else self.peak
+                return min(lower + (upper - lower) * (target - seen) / count, self.peak)
+            seen += count
+        return self.peak
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "count" : self.count,
+            "mean"  : round(self.total / self.count, 6) if self.count else 0.0,
+            "p50"   : round(self.quantile(0.50), 6),
+            "p95"   : round(self.quantile(0.95), 6),
+            "p99"   : round(self.quantile(0.99), 6),
+            "max"   : round(self.peak, 6),
+        }
+
+
+class Span(object):
+
+    __slots__ = ("name", "device", "begin")
+
+    def __init__(self, name: str, device: typing.Optional[str]) -> None:
+        self.name   = name
+        self.device = device
+
+    def __enter__(self) -> "Span":
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *_) -> None:
+        Metrics.observe(self.name, self.device, time.perf_counter() - self.begin)
+
+
+class Metrics(object):
+
+    enabled = False
+
+    series: dict[tuple[str, str], Histogram] = {}
+
+    idle = contextlib.nullcontext()
+
+    @staticmethod
+    def observe(name: str, device: typing.Optional[str], seconds: float) -> None:
+        if not Metrics.enabled:
+            return None
+
+        if not (histogram := Metrics.series.get(key := (name, device or "*"))):
+            histogram = Metrics.series[key] = Histogram()
+        histogram.observe(seconds)
+
+    @staticmethod
+    def span(name: str, device: typing.Optional[str] = None) -> typing.ContextManager:
+        return Span(name, device) if Metrics.enabled else Metrics.idle
+
+    @staticmethod
+    def timed(function: typing.Callable[..., typing.Awaitable]) -> typing.Callable[..., typing.Awaitable]:
+        name = f"tool.{function.__name__}"
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs) -> typing.Any:
+            if not Metrics.enabled:
+                return await function(*args, **kwargs)
+            with Span(name, None):
+                return await function(*args, **kwargs)
+
+        return wrapper
+
+    @staticmethod
+    def snapshot() -> dict[str, dict[str, dict[str, typing.Any]]]:
+        spans: dict[str, dict[str, dict[str, typing.Any]]] = {}
+        for (name, device), histogram in sorted(Metrics.series.items()):
+            spans.setdefault(name, {})[device] = histogram.to_dict()
+        return spans
+
+    @staticmethod
+    def exposition(prefix: str, gauges: dict[str, dict[str, float]]) -> str:
+        lines = [
+            f"# HELP {prefix}_span_seconds Timing spans by span name and device",
+            f"# TYPE {prefix}_span_seconds histogram",
+        ]
+
+        for (name, device), histogram in sorted(Metrics.series.items()):
+            labels, cumulative = f'span="{name}",device="{device}"', 0
+            for bound, count in zip(Histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'{prefix}_span_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+            lines += [
+                f'{prefix}_span_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}',
+                f"{prefix}_span_seconds_sum{{{labels}}} {histogram.total:.6f}",
+                f"{prefix}_span_seconds_count{{{labels}}} {histogram.count}",
+            ]
+
+        for gauge, values in gauges.items():
+            lines.append(f"# TYPE {prefix}_{gauge} gauge")
+            lines += [f'{prefix}_{gauge}{{device="{device}"}} {value}' for device, value in values.items()]
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def reset() -> None:
+        Metrics.series.clear()
+
+
+if __name__ == '__main__':
+    pass
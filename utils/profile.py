@@ -0,0 +1,64 @@
+#  ____             __ _ _
+# |  _ \ _ __ ___  / _(_) | ___
+# | |_) | '__/ _ \| |_| | |/ _ \
+# |  __/| | | (_) |  _| | |  __/
+# |_|   |_|  \___/|_| |_|_|\___|
+#
+
+import os
+import sys
+import time
+import subprocess
+from pathlib import Path
+from utils import const
+
+
+class Profile(object):
+
+    origin = time.perf_counter()
+
+    @staticmethod
+    def enabled() -> bool:
+        return "--profile-startup" in sys.argv
+
+    @staticmethod
+    def elapsed() -> float:
+        return time.perf_counter() - Profile.origin
+
+    @staticmethod
+    def imports(module: str, top: int = 12) -> list[tuple[str, float]]:
+        if "__compiled__" in globals():
+            return []
+
+        root = Path(__file__).resolve().parent.parent
+        env  = os.environ | {"PYTHONPATH": os.pathsep.join(filter(None, [str(root), os.environ.get("PYTHONPATH")]))}
+
+        resp = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=root, env=env, capture_output=True, text=True, encoding=const.CHARSET, errors=const.IGNORE
+        )
+
+        total: dict[str, float] = {}
+        for line in resp.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            own, _, name = line[len("import time:"):].split("|")
+            package = name.strip().split(".")[0]
+            total[package] = total.get(package, 0.0) + int(own) / 1000
+
+        return sorted(total.items(), key=lambda x: -x[1])[:top]
+
+    @staticmethod
+    def report(title: str, module: str, marks: dict[str, float]) -> str:
+        lines = [f"⏱️ Startup profile {title}"]
+
+        if rows := Profile.imports(module):
+            lines += [f"  import {name:<24}{own:>10.1f} ms" for name, own in rows]
+
+        lines += [f"  {name:<31}{cost * 1000:>10.1f} ms" for name, cost in marks.items()]
+
+        return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    pass
@@ -7,9 +7,72 @@
 #
 
 import json
-import httpx
 import typing
+import asyncio
+import importlib.util
 from loguru import logger
+from utils import const
+
+if typing.TYPE_CHECKING:
+    import httpx
+
+
+class Pool(object):
+
+    client: typing.Optional["httpx.AsyncClient"] = None
+
+    @classmethod
+    def acquire(cls) -> "httpx.AsyncClient":
+        if cls.client is None or cls.client.is_closed:
+            import httpx
+
+            cls.client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=8, keepalive_expiry=120.0),
+                timeout=60.0
+            )
+        return cls.client
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls.client and not cls.client.is_closed:
+            await cls.client.aclose()
+        cls.client = None
+
+
+class SseParser(object):
+
+    def __init__(self) -> None:
+        self.data: list[str] = []
+        self.event = ""
+        self.last_id: typing.Optional[str] = None
+        self.retry: typing.Optional[int] = None
+
+    def feed(self, line: str) -> typing.Optional[dict[str, typing.Any]]:
+        if not line:
+            if not self.data:
+                self.event = ""; return None
+            dispatch = {"event": self.event or "message", "data": "\n".join(self.data), "id": self.last_id}
+            self.data, self.event = [], ""
+            return dispatch
+
+        if line.startswith(":"):
+            return None
+
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+
+        match field:
+            case "data":
+                self.data.append(value)
+            case "event":
+                self.event = value
+            case "id" if "\0" not in value:
+                self.last_id = value
+            case "retry" if value.isdigit():
+                self.retry = int(value)
+
+        return None
 
 
 async def handle_event(event: dict) -> None:
@@ -24,28 +87,59 @@ async def handle_event(event: dict) -> None:
             logger.info(f"🟢 Plan done ...")
 
 
-async def stream_planner(payload: dict[str, typing.Any], timeout: float = 60.0) -> typing.AsyncGenerator[dict, None]:
-    url     = f"https://api.appserverx.com/planner"
+async def stream_planner(
+    payload: dict[str, typing.Any],
+    timeout: float = 60.0,
+    url: str = const.PLANNER_URL,
+    reconnect: int = 3
+) -> typing.AsyncGenerator[dict, None]:
+
+    import httpx
+
     headers = {
         "Accept": "text/event-stream", "Content-Type": "application/json"
     }
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        async with client.stream("POST", url, headers=headers, json=payload) as resp:
-            resp.raise_for_status()
+    parser, attempt, finished = SseParser(), 0, False
+
+    while not finished:
+        if parser.last_id is not None:
+            headers["Last-Event-ID"] = parser.last_id
+
+        try:
+            async with Pool.acquire().stream("POST", url, headers=headers, json=payload, timeout=timeout) as resp:
+                resp.raise_for_status()
+
+                async for line in resp.aiter_lines():
+                    if not (sse := parser.feed(line)):
+                        continue
+
+                    try:
+                        event = json.loads(sse["data"])
+                    except json.JSONDecodeError:
+                        logger.debug(f"SSE {sse['event']} non-json data {sse['data']!r}")
+                        continue
+
+                    if isinstance(event, dict) and sse["event"] != "message":
+                        event.setdefault("type", sse["event"])
+
+                    await handle_event(event)
 
-            async for line in resp.aiter_lines():
-                if not line or not line.startswith("data:"):
-                    continue
+                    attempt  = 0
+                    finished = finished or event.get("type") == "done"
+                    yield event
 
-                try:
-                    event = json.loads(line[len("data:"):].strip())
-                except json.JSONDecodeError:
-                    continue
+            finished = finished or parser.last_id is None
 
-                await handle_event(event)
+        except httpx.TransportError as e:
+            if parser.last_id is None:
+                raise
+            logger.warning(f"Planner stream interrupted at {parser.last_id}: {e}")
 
-                yield event
+        if not finished:
+            if (attempt := attempt + 1) > reconnect:
+                raise ConnectionError(f"Planner stream lost after {reconnect} reconnects ...")
+            await asyncio.sleep((parser.retry or 1000) / 1000)
 
 
 if __name__ == '__main__':